@@ -0,0 +1,91 @@
+import os
+import json
+import pickle
+import hashlib
+import logging
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# ══════════════════════════════════════════════════════
+#  backtest_cache.py  —  Cache kết quả backtest trên đĩa
+#  Key = hash(dữ liệu nến) + tham số + phiên bản engine,
+#  nên chỉ trúng cache khi cả nến lẫn tham số không đổi.
+#  Giới hạn dung lượng, loại bỏ file ít dùng nhất (LRU theo mtime).
+# ══════════════════════════════════════════════════════
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+def data_hash(df):
+    """Hash of the candle data (timestamps + OHLCV) — changes whenever any candle changes."""
+    h = hashlib.sha256()
+    h.update(df['timestamp'].astype('int64').to_numpy().tobytes())
+    h.update(np.ascontiguousarray(df[OHLCV_COLUMNS[1:]].to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()
+
+def make_key(kind, digest, **params):
+    payload = json.dumps({'kind': kind, 'data': digest, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class BacktestCache:
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or config.BACKTEST_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else config.BACKTEST_CACHE_MAX_MB * 1024 * 1024
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {key}: {e}")
+            self._remove(path)
+            return None
+        # Đánh dấu vừa dùng cho LRU
+        os.utime(path)
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.pkl'):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            self._remove(path)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.pkl'):
+                    self._remove(entry.path)
@@ -0,0 +1,134 @@
+"""
+Benchmark + query-plan check cho các truy vấn nóng của database.py.
+
+Chạy:
+    python bench_db.py              # seed 100k users vào DB tạm, đo thời gian, kiểm tra EXPLAIN QUERY PLAN
+    python bench_db.py --users 20000
+
+Thoát với mã lỗi 1 nếu có truy vấn nóng nào phải quét toàn bảng.
+"""
+
+import asyncio
+import os
+import re
+import sys
+import random
+import sqlite3
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+import database
+
+# (tên, SQL, tham số) — các truy vấn mà scanner / menu / theo dõi vị thế chạy thường xuyên
+HOT_QUERIES = [
+    ("open positions by user", "SELECT * FROM open_positions WHERE user_id = ?", (42,)),
+    ("exchange apis by user", "SELECT * FROM exchange_apis WHERE user_id = ?", (42,)),
+    ("watched pairs by user", "SELECT * FROM watched_pairs WHERE user_id = ?", (42,)),
+    ("subscribers of (symbol, timeframe)",
+     "SELECT user_id FROM watched_pairs WHERE symbol = ? AND timeframe = ?", ("BTC/USDT:USDT", "15m")),
+    ("distinct pairs grouped by symbol",
+     "SELECT symbol, timeframe, COUNT(*) FROM watched_pairs GROUP BY symbol, timeframe", ()),
+    ("scan plan: page of users",
+     "SELECT user_id, auto_trade_enabled FROM trading_config WHERE user_id > ? AND EXISTS "
+     "(SELECT 1 FROM watched_pairs w WHERE w.user_id = trading_config.user_id) ORDER BY user_id LIMIT ?", (0, 1000)),
+    ("scan plan: pairs of a user page",
+     "SELECT user_id, symbol, timeframe FROM watched_pairs WHERE user_id BETWEEN ? AND ?", (0, 1000)),
+    ("watched pairs keyset page",
+     "SELECT id, user_id, symbol, timeframe FROM watched_pairs WHERE id > ? ORDER BY id LIMIT ?", (0, 1000)),
+    ("recent signals for a symbol (get_recent_signals)",
+     "SELECT * FROM signal_events WHERE symbol = ? ORDER BY emitted_at DESC, id DESC LIMIT ?", ("BTC/USDT:USDT", 20)),
+    ("signal counts of a user (get_signal_counts)",
+     "SELECT user_id, COUNT(*) FROM signal_events WHERE user_id = ? AND emitted_at >= ?", (42, 0)),
+    ("signal counts per user in a window (get_signal_counts)",
+     "SELECT user_id, COUNT(*) FROM signal_events INDEXED BY idx_signal_events_emitted_user "
+     "WHERE emitted_at >= ? GROUP BY user_id", (0,)),
+]
+
+_FULL_SCAN = re.compile(r"^SCAN \w+$")
+
+def check_query_plans(conn):
+    """Return [(name, plan detail)] for hot queries whose plan is a full scan or needs a temp B-tree."""
+    failures = []
+    for name, sql, params in HOT_QUERIES:
+        details = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        # Grouping rows that an index SEARCH already bounded (e.g. a time window) is fine
+        searched = any(detail.startswith("SEARCH") for detail in details)
+        for detail in details:
+            if _FULL_SCAN.match(detail) or ("TEMP B-TREE" in detail and not (searched and "GROUP BY" in detail)):
+                failures.append((name, " | ".join(details)))
+                break
+    return failures
+
+def seed(path, n_users):
+    symbols = [p for p in config.POPULAR_PAIRS]
+    timeframes = ["5m", "15m", "1h", "4h"]
+    rnd = random.Random(0)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT INTO users (user_id) VALUES (?)", ((u,) for u in range(n_users)))
+        conn.executemany("INSERT INTO trading_config (user_id) VALUES (?)", ((u,) for u in range(n_users)))
+        conn.executemany(
+            "INSERT INTO exchange_apis (user_id, exchange_name, api_key, api_secret) VALUES (?, ?, 'k', 's')",
+            ((u, rnd.choice(config.SUPPORTED_EXCHANGES)) for u in range(n_users))
+        )
+        conn.executemany(
+            "INSERT INTO open_positions (user_id, exchange_name, symbol, side, entry_price, quantity, tp_price, sl_price, order_id) "
+            "VALUES (?, 'Binance', ?, 'LONG', 100, 1, 101, 99, 'x')",
+            ((rnd.randrange(n_users), rnd.choice(symbols)) for _ in range(n_users))
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO watched_pairs (user_id, symbol, timeframe) VALUES (?, ?, ?)",
+            ((u, rnd.choice(symbols), rnd.choice(timeframes)) for u in range(n_users) for _ in range(3))
+        )
+        conn.executemany(
+            "INSERT INTO signal_events (user_id, symbol, timeframe, side, bar_ts, emitted_at, price) "
+            "VALUES (?, ?, '15m', 'LONG', ?, ?, 100)",
+            ((rnd.randrange(n_users), rnd.choice(symbols), i * 60_000, i * 60_000) for i in range(n_users * 2))
+        )
+    conn.execute("ANALYZE")
+    conn.close()
+
+async def _drain(iterator):
+    async for _ in iterator:
+        pass
+
+async def time_calls(label, coro_factory, n=1000):
+    t0 = time.perf_counter()
+    for i in range(n):
+        await coro_factory(i)
+    elapsed = (time.perf_counter() - t0) / n * 1000
+    print(f"  {label:<40} {elapsed:8.3f} ms/call")
+
+async def main(n_users):
+    tmpdir = tempfile.mkdtemp()
+    config.DB_PATH = os.path.join(tmpdir, "bench.sqlite")
+    await database.init_db()
+    print(f"Seeding {n_users} users / positions...")
+    t0 = time.perf_counter()
+    seed(config.DB_PATH, n_users)
+    print(f"  seeded in {time.perf_counter() - t0:.1f}s")
+
+    print("Timings:")
+    await time_calls("get_open_positions(user_id)", lambda i: database.get_open_positions(i % n_users))
+    await time_calls("get_exchange_apis(user_id)", lambda i: database.get_exchange_apis(i % n_users))
+    await time_calls("get_watched_pairs(user_id)", lambda i: database.get_watched_pairs(i % n_users))
+    await time_calls("get_all_watched_pairs()", lambda i: database.get_all_watched_pairs(), n=5)
+    await time_calls("iter_scan_plan() (full pass)", lambda i: _drain(database.iter_scan_plan()), n=5)
+    await database.close_db()
+
+    conn = sqlite3.connect(config.DB_PATH)
+    failures = check_query_plans(conn)
+    conn.close()
+    print("Query plans:", "OK" if not failures else "FULL SCANS FOUND")
+    for name, plan in failures:
+        print(f"  ✗ {name}: {plan}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    users = 100_000
+    if "--users" in sys.argv:
+        users = int(sys.argv[sys.argv.index("--users") + 1])
+    sys.exit(asyncio.run(main(users)))
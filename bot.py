@@ -9,8 +9,15 @@ from telegram.ext import (
 
 import config
 import database
+import execution_queue
+import db_maintenance
 import keyboards
+import market_cache
 import pair_cache
+import position_monitor
+import reconciler
+import signal_log
+from exchanges import paper_exchange
 from scanner import scanner_task
 
 logging.basicConfig(
@@ -252,6 +259,21 @@ async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             )
             await query.edit_message_text(msg, reply_markup=kb, parse_mode="Markdown")
 
+        elif data == "setup_api_Paper":
+            # Paper trading needs no keys: the account is simulated in memory by user id
+            await database.save_exchange_api(user_id, "Paper", f"paper-{user_id}", "paper")
+            msg = (
+                f"📝 *PAPER TRADING*\n"
+                f"{DIVIDER}\n"
+                f"✅  Đã bật tài khoản giả lập · `{config.PAPER_START_BALANCE:,.0f} USDT`\n"
+                "Lệnh khớp theo giá scanner (có trượt giá + phí), không gửi lên sàn nào.\n"
+                f"{DIVIDER}\n"
+                "_Nhấn tên sàn để bật/tắt._"
+            )
+            apis = await database.get_exchange_apis(user_id)
+            kb = keyboards.get_exchange_list_keyboard(config.SUPPORTED_EXCHANGES, apis)
+            await query.edit_message_text(msg, reply_markup=kb, parse_mode="Markdown")
+
         elif data.startswith("setup_api_"):
             ex_name = data.replace("setup_api_", "")
             context.user_data['setup_exchange'] = ex_name  # type: ignore[index]
@@ -381,15 +403,15 @@ async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         # ── Positions ────────────────────────────────────────────
         elif data == "menu_positions":
             await _loading(query)
-            positions = list(await database.get_open_positions(user_id))
+            positions = await database.get_open_positions(user_id)
             if positions:
                 lines: list[str] = []
                 for p in positions:
-                    side_icon = "🟢" if p['side'] == 'LONG' else "🔴"
+                    side_icon = "🟢" if p.side == 'LONG' else "🔴"
                     lines.append(
-                        f"{side_icon} *{p['symbol'].split('/')[0]}* ({p['side']}) · _{p['exchange_name']}_\n"
-                        f"   🏷 Entry: `{p['entry_price']:.4f}`\n"
-                        f"   🎯 TP: `{p['tp_price']:.4f}`  🛡 SL: `{p['sl_price']:.4f}`"
+                        f"{side_icon} *{p.symbol.split('/')[0]}* ({p.side}) · _{p.exchange_name}_\n"
+                        f"   🏷 Entry: `{p.entry_price:.4f}`\n"
+                        f"   🎯 TP: `{p.tp_price:.4f}`  🛡 SL: `{p.sl_price:.4f}`"
                     )
                 msg = (
                     f"📈 *VỊ THẾ ĐANG MỞ  ({len(positions)})*\n"
@@ -404,6 +426,34 @@ async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
                 )
             await query.edit_message_text(msg, reply_markup=keyboards.get_cancel_keyboard(), parse_mode="Markdown")
 
+        # ── PnL ──────────────────────────────────────────────────
+        elif data == "menu_pnl":
+            total, per_symbol = await database.get_pnl_summary(user_id)
+            if total and total['trades']:
+                win_rate = total['wins'] / total['trades'] * 100
+                pnl_icon = "🟢" if total['net_pnl'] >= 0 else "🔴"
+                sym_lines = "\n".join(
+                    f"  `{r['symbol'].split('/')[0]}`  {r['trades']} lệnh · `{r['net_pnl']:+.2f}` USDT"
+                    for r in per_symbol
+                )
+                msg = (
+                    f"📊 *LÃI / LỖ ĐÃ ĐÓNG*\n"
+                    f"{DIVIDER}\n"
+                    f"🧾  Tổng lệnh:   `{total['trades']}`\n"
+                    f"🏆  Tỉ lệ thắng: `{win_rate:.1f}%`\n"
+                    f"💸  Phí:         `{total['fees']:.2f} USDT`\n"
+                    f"{pnl_icon}  PNL Net:     `{total['net_pnl']:+.2f} USDT`\n"
+                    f"{DIVIDER}\n"
+                    f"*Theo cặp:*\n{sym_lines}"
+                )
+            else:
+                msg = (
+                    f"📊 *LÃI / LỖ ĐÃ ĐÓNG*\n"
+                    f"{DIVIDER}\n"
+                    "📭  Chưa có lệnh nào được đóng."
+                )
+            await query.edit_message_text(msg, reply_markup=keyboards.get_cancel_keyboard(), parse_mode="Markdown")
+
         elif data == "ignore":
             pass
 
@@ -449,8 +499,9 @@ async def ask_pair_add(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     for sym in parts:
         if "/" not in sym:
             sym = (sym[:-4] + "/USDT:USDT") if sym.endswith("USDT") else (sym + "/USDT:USDT")
-        await database.add_user_symbol(user_id, sym)
-        added.append(sym)
+        if sym not in added:
+            added.append(sym)
+    await database.add_user_symbols(user_id, added)
 
     if added:
         added_txt = "\n".join(f"  ✅ `{s.split('/')[0]}`" for s in added)
@@ -524,16 +575,34 @@ async def ask_api_passphrase(update, context):
 
 async def post_init(application: Application) -> None:
     await database.init_db()
+    # Refuse to start on a DB_SHARDS the data isn't laid out for
+    await database.check_shard_layout()
     logger.info("Loading Binance futures symbols...")
     await pair_cache.load_binance_futures_symbols()
+    asyncio.create_task(market_cache.market_cache_task())
     asyncio.create_task(scanner_task(application))
+    asyncio.create_task(signal_log.signal_log_task())
+    asyncio.create_task(db_maintenance.db_maintenance_task())
+    asyncio.create_task(position_monitor.position_monitor_task(application))
+    asyncio.create_task(execution_queue.report_task())
+    asyncio.create_task(reconciler.reconciler_task(application))
+    asyncio.create_task(paper_exchange.paper_task())
     logger.info("Bot started — Scanner running.")
 
+async def post_shutdown(application: Application) -> None:
+    await position_monitor.close()
+    await execution_queue.close()
+    paper_exchange.save()
+    await signal_log.flush()
+    await database.close_db()
+    logger.info("Database connections closed.")
+
 def main() -> None:
     application = (
         Application.builder()
         .token(config.TELEGRAM_BOT_TOKEN)
         .post_init(post_init)
+        .post_shutdown(post_shutdown)
         .build()
     )
 
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+import aiohttp
+
+import config
+from candle_store import CandleStore
+from rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# ══════════════════════════════════════════════════════
+#  candle_downloader.py  —  Tải nến lịch sử song song
+#  Chia khoảng thời gian thành các chunk (mỗi chunk = 1 request),
+#  tải đồng thời dưới giới hạn weight của sàn, ghi vào CandleStore
+#  và checkpoint từng chunk để có thể chạy tiếp khi bị ngắt.
+# ══════════════════════════════════════════════════════
+
+BINANCE_FUTURES_URL = "https://fapi.binance.com"
+KLINES_PATH = "/fapi/v1/klines"
+
+# Binance USDT-M: tối đa 1500 nến mỗi request, giới hạn 2400 weight / phút / IP
+MAX_KLINES_PER_REQUEST = 1500
+WEIGHT_PER_MINUTE = 2400
+
+RETRY_STATUSES = {418, 429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+
+def klines_weight(limit):
+    """Request weight of /fapi/v1/klines by limit (Binance docs)."""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+def market_id(symbol):
+    """'BTC/USDT:USDT' or 'BTC/USDT' -> 'BTCUSDT'"""
+    return symbol.split(":")[0].replace("/", "")
+
+def build_chunks(since_ms, until_ms, timeframe, bars_per_chunk=MAX_KLINES_PER_REQUEST):
+    """
+    Split [since_ms, until_ms) into chunks on an absolute grid (multiples of the chunk
+    length since the epoch), so reruns with a later `since` produce the same chunk
+    starts and find their checkpoints. The last chunk is cut at until_ms.
+    """
+    chunk_ms = config.TIMEFRAME_MINUTES[timeframe] * 60_000 * bars_per_chunk
+    start = since_ms - since_ms % chunk_ms
+    return [(s, min(s + chunk_ms, until_ms)) for s in range(start, until_ms, chunk_ms)]
+
+class CandleDownloader:
+    def __init__(self, store: CandleStore, base_url=BINANCE_FUTURES_URL, concurrency=8,
+                 weight_per_minute=WEIGHT_PER_MINUTE, bars_per_chunk=MAX_KLINES_PER_REQUEST):
+        self.store = store
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.bars_per_chunk = bars_per_chunk
+        self.weight = klines_weight(bars_per_chunk)
+        # Dùng 90% hạn mức để chừa chỗ cho scanner chạy cùng IP
+        rate = weight_per_minute * 0.9 / 60
+        self.bucket = TokenBucket(rate, capacity=max(self.weight, rate * 5))
+        self.requests = 0
+
+    async def _fetch_chunk(self, session, symbol, timeframe, start, end):
+        params = {
+            'symbol': market_id(symbol),
+            'interval': timeframe,
+            'startTime': start,
+            'endTime': end - 1,
+            'limit': self.bars_per_chunk,
+        }
+        for attempt in range(MAX_RETRIES):
+            await self.bucket.acquire(self.weight)
+            self.requests += 1
+            try:
+                async with session.get(self.base_url + KLINES_PATH, params=params) as resp:
+                    if resp.status in RETRY_STATUSES:
+                        retry_after = float(resp.headers.get('Retry-After', 2 ** attempt))
+                        if resp.status in (418, 429):
+                            self.bucket.drain(retry_after)
+                        logger.warning(f"{symbol} {timeframe} chunk {start}: HTTP {resp.status}, retry in {retry_after}s")
+                        await asyncio.sleep(retry_after)
+                        continue
+                    resp.raise_for_status()
+                    data = await resp.json()
+                    # Chunk là nửa mở [start, end): bỏ nến biên thuộc chunk kế tiếp
+                    return [[int(k[0]), k[1], k[2], k[3], k[4], k[5]] for k in data if start <= int(k[0]) < end]
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                logger.warning(f"{symbol} {timeframe} chunk {start}: {e!r}, retry {attempt + 1}/{MAX_RETRIES}")
+                await asyncio.sleep(2 ** attempt)
+        raise RuntimeError(f"Failed to download {symbol} {timeframe} chunk {start} after {MAX_RETRIES} attempts")
+
+    async def download(self, symbols, timeframe, since_ms, until_ms):
+        """Download every symbol over [since_ms, until_ms). Returns number of chunks fetched."""
+        jobs = []
+        for symbol in symbols:
+            done = self.store.done_chunks(symbol, timeframe)
+            jobs.extend((symbol, s, e) for s, e in build_chunks(since_ms, until_ms, timeframe, self.bars_per_chunk)
+                        if s not in done)
+        if not jobs:
+            return 0
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+        tf_ms = config.TIMEFRAME_MINUTES[timeframe] * 60_000
+        chunk_ms = tf_ms * self.bars_per_chunk
+        errors = []
+
+        async def worker(session):
+            while True:
+                try:
+                    symbol, start, end = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    ohlcv = await self._fetch_chunk(session, symbol, timeframe, start, end)
+                    # Bỏ nến chưa đóng tại thời điểm tải (INSERT OR IGNORE sẽ không bao giờ sửa lại nó).
+                    # Chỉ checkpoint chunk đầy đủ, kết thúc trước nến đã đóng cuối cùng; chunk bị
+                    # cắt ở until_ms hoặc còn nến đang chạy sẽ được tải lại lần sau.
+                    # (end + tf_ms: nến cuối của chunk mở trước end nên đã đóng trước mốc này,
+                    # kể cả khi nến không thẳng hàng với lưới chunk như nến 1w)
+                    fetched_at = int(time.time() * 1000)
+                    ohlcv = [c for c in ohlcv if c[0] + tf_ms <= fetched_at]
+                    complete = end - start == chunk_ms and end + tf_ms <= fetched_at
+                    self.store.insert(symbol, timeframe, ohlcv, chunk_start=start if complete else None)
+                except Exception as e:
+                    errors.append(e)
+                    logger.error(f"Download error {symbol} {timeframe}: {e}")
+
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            await asyncio.gather(*(worker(session) for _ in range(self.concurrency)))
+        if errors:
+            logger.warning(f"{len(errors)} chunk(s) failed — rerun to resume from checkpoint.")
+        return len(jobs) - len(errors)
+
+async def download_history(symbols, timeframe, days, store=None, **kwargs):
+    until_ms = int(time.time() * 1000)
+    since_ms = int((datetime.now() - timedelta(days=days)).timestamp() * 1000)
+    own_store = store is None
+    store = store or CandleStore()
+    try:
+        downloader = CandleDownloader(store, **kwargs)
+        t0 = time.time()
+        fetched = await downloader.download(symbols, timeframe, since_ms, until_ms)
+        logger.info(f"Downloaded {fetched} chunk(s) for {len(symbols)} symbol(s) in {time.time() - t0:.1f}s "
+                    f"({downloader.requests} requests).")
+        return fetched
+    finally:
+        if own_store:
+            store.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    pairs = [p.split(":")[0] for p in config.POPULAR_PAIRS]
+    asyncio.run(download_history(pairs, "1m", days=365))
@@ -0,0 +1,70 @@
+import sqlite3
+import config
+
+class CandleStore:
+    """
+    Local OHLCV store (SQLite) used by the historical downloader and backtests.
+    Candles are keyed by (symbol, timeframe, ts), so re-inserting overlapping
+    ranges is a no-op. Completed download chunks are checkpointed in the same
+    file so an interrupted download can resume where it stopped.
+    """
+    def __init__(self, path=None):
+        self.path = path or config.CANDLE_STORE_PATH
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS candles (
+                symbol TEXT,
+                timeframe TEXT,
+                ts INTEGER,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL,
+                PRIMARY KEY (symbol, timeframe, ts)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS download_chunks (
+                symbol TEXT,
+                timeframe TEXT,
+                chunk_start INTEGER,
+                PRIMARY KEY (symbol, timeframe, chunk_start)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    def insert(self, symbol, timeframe, ohlcv, chunk_start=None):
+        """Insert candles (and optionally checkpoint their chunk) in one transaction."""
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO candles (symbol, timeframe, ts, open, high, low, close, volume) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                ((symbol, timeframe, int(c[0]), float(c[1]), float(c[2]), float(c[3]), float(c[4]), float(c[5]))
+                 for c in ohlcv)
+            )
+            if chunk_start is not None:
+                self.conn.execute(
+                    'INSERT OR IGNORE INTO download_chunks (symbol, timeframe, chunk_start) VALUES (?, ?, ?)',
+                    (symbol, timeframe, chunk_start)
+                )
+
+    def done_chunks(self, symbol, timeframe):
+        cur = self.conn.execute(
+            'SELECT chunk_start FROM download_chunks WHERE symbol = ? AND timeframe = ?', (symbol, timeframe)
+        )
+        return {r[0] for r in cur}
+
+    def load(self, symbol, timeframe, since=None, until=None):
+        """Return [[ts, open, high, low, close, volume], ...] for since <= ts < until, ordered by ts."""
+        cur = self.conn.execute(
+            'SELECT ts, open, high, low, close, volume FROM candles '
+            'WHERE symbol = ? AND timeframe = ? AND ts >= ? AND ts < ? ORDER BY ts',
+            (symbol, timeframe, since or 0, until or 2**62)
+        )
+        return [list(r) for r in cur]
+
+    def close(self):
+        self.conn.close()
@@ -13,8 +13,57 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "YOUR_TELEGRAM_BOT_TOKEN_HE
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'bot_database.sqlite')
 
+# Per-user tables are split across DB_SHARDS files (shards.py); DB_PATH keeps the
+# global tables. Only 1 -> N is supported: run migrate_shards.py after raising it on
+# an unsharded database. The count is recorded in DB_PATH and the bot refuses to
+# start if it changes afterwards.
+DB_SHARDS = int(os.getenv("DB_SHARDS", "1"))
+
+# SQLite connection manager (db_manager.py): 1 writer + N readers per database file
+DB_READERS = 4
+DB_CACHE_KB = 8192          # page cache per connection
+DB_BUSY_TIMEOUT_MS = 5000
+DB_STATEMENT_CACHE = 256    # prepared statements kept per connection
+DB_PAGE_SIZE = 1000         # rows per page for streamed full-table reads (scanner, monitors)
+
+# Background SQLite maintenance (db_maintenance.py)
+DB_MAINTENANCE_INTERVAL = 6 * 3600   # seconds between runs
+DB_QUIET_SECONDS = 30                # wait for this long without writes before running
+DB_QUIET_MAX_WAIT = 600              # ...but run anyway after waiting this long
+DB_VACUUM_BATCH_PAGES = 1000         # freelist pages released per writer lock
+DB_ANALYSIS_LIMIT = 1000             # rows sampled per index by ANALYZE
+
+# Per-user read cache (user_cache.py): max users kept in memory (LRU)
+USER_CACHE_SIZE = 5000
+
+# Signal history (signal_log.py): buffered writes + retention
+SIGNAL_LOG_FLUSH_INTERVAL = 5      # seconds between batched flushes
+SIGNAL_LOG_MAX_BUFFER = 500        # flush early when this many events are buffered
+SIGNAL_RETENTION_DAYS = 90
+SIGNAL_PURGE_INTERVAL = 3600       # seconds between retention runs
+
+# Local historical candle store (candle_downloader.py / backtests)
+CANDLE_STORE_PATH = os.path.join(BASE_DIR, 'candles.sqlite')
+
+# Backtest result cache (backtest_cache.py) — LRU eviction above the size limit
+BACKTEST_CACHE_DIR = os.path.join(BASE_DIR, '.backtest_cache')
+BACKTEST_CACHE_MAX_MB = 512
+
+# Exchange market metadata (market_cache.py): precision, minimums, contract size
+MARKET_CACHE_PATH = os.path.join(BASE_DIR, 'markets_cache.json')
+MARKET_CACHE_TTL = 6 * 3600             # seconds before an exchange's markets are reloaded
+MARKET_CACHE_REFRESH_INTERVAL = 600     # seconds between freshness checks
+
 # Supported Exchanges
-SUPPORTED_EXCHANGES = ["Binance", "BingX", "Bybit", "MEXC", "OKX"]
+SUPPORTED_EXCHANGES = ["Binance", "BingX", "Bybit", "MEXC", "OKX", "Paper"]
+
+# Paper trading (exchanges/paper_exchange.py): simulated fills at the scanner's cached price
+PAPER_START_BALANCE = 10000.0       # USDT in a new paper account
+PAPER_SLIPPAGE = 0.0005             # fraction of the price lost on every market fill
+PAPER_FEE_RATE = 0.0005             # taker fee, fraction of the filled notional
+PAPER_STATE_PATH = os.path.join(BASE_DIR, 'paper_accounts.json')
+PAPER_SAVE_INTERVAL = 60            # seconds between saves of the simulated accounts
+PAPER_ORDER_HISTORY = 100           # recent orders kept per account for client order id lookups
 
 # Supported Timeframes
 SUPPORTED_TIMEFRAMES = ["1m", "3m", "5m", "15m", "30m", "1h", "2h", "4h", "6h", "8h", "12h", "1d", "3d", "1w"]
@@ -34,6 +83,43 @@ SMA_PERIOD = 20
 
 # Scanner interval (seconds)
 SCANNER_INTERVAL = 30
+SCANNER_CONCURRENCY = 20            # users scanned at the same time (requests are paced by execution_queue)
+
+# Last-price cache (price_cache.py): prices older than this are refetched with a ticker call
+PRICE_CACHE_MAX_AGE = 10
+
+# Position monitor (position_monitor.py): TP/SL checks against one ticker snapshot per exchange
+POSITION_MONITOR_INTERVAL = 5       # seconds between checks
+POSITION_MONITOR_CONCURRENCY = 10   # close orders sent at the same time
+
+# Position reconciliation (reconciler.py): one fetch_positions per account with open positions
+RECONCILE_INTERVAL = 300            # seconds between passes
+RECONCILE_CONCURRENCY = 10          # accounts fetched at the same time
+RECONCILE_GRACE_SECONDS = 120       # positions younger than this are never treated as stale
+RECONCILE_PRICE_MAX_AGE = 600       # cached price accepted as exit price of a stale position
+
+# Auto-trade fan-out (trade_manager.py)
+ORDER_FANOUT_TIMEOUT = 15           # seconds for all of a user's exchanges to place the order
+ORDER_RETRIES = 2                   # quick retries of an order after a timeout / network error
+ORDER_RETRY_DELAY = 0.3             # seconds before the first lookup-then-retry (doubles each time)
+LATENCY_SAMPLES = 200               # signal-to-fill samples kept per exchange
+SEED_EXCHANGE_SETTINGS = True       # load current leverage / margin mode on first use of an account (where supported)
+EXCHANGE_SETTINGS_TTL = 3600        # seconds a confirmed leverage / margin mode is trusted
+
+# Shared per-exchange execution queue (execution_queue.py). Limits are per host IP,
+# shared by all users: (requests per second, burst), kept below each venue's published limits.
+EXECUTION_LIMITS = {
+    "Binance": (20, 40),   # 2400 weight / min per IP
+    "Bybit":   (10, 20),   # 600 requests / 5 s per IP, 10 orders / s per UID
+    "OKX":     (10, 20),   # 60 orders / 2 s per UID, public endpoints 20 / 2 s
+    "BingX":   (5, 10),    # order endpoints 10 / s
+    "MEXC":    (5, 10),    # contract order endpoints 20 / 2 s
+    "Paper":   (1000, 1000),  # simulated, no venue behind it
+}
+EXECUTION_DEFAULT_LIMIT = (5, 10)
+EXECUTION_WORKERS = 8               # concurrent requests in flight per exchange
+EXECUTION_BACKOFF_SECONDS = 10      # pause after the venue answers 429 / rate limit
+EXECUTION_REPORT_INTERVAL = 60      # seconds between queue latency reports
 
 # Popular trading pairs for quick selection
 POPULAR_PAIRS = [
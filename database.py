@@ -1,114 +1,296 @@
-import aiosqlite
+import asyncio
 import logging
+from typing import NamedTuple, Optional
 import config
+import db_manager
+import shards
+import user_cache
 
 logger = logging.getLogger(__name__)
 
+# Compact records yielded by the paged iterators (no per-row column mapping)
+class WatchedPair(NamedTuple):
+    id: int
+    user_id: int
+    symbol: str
+    timeframe: str
+
+class OpenPosition(NamedTuple):
+    id: int
+    user_id: int
+    exchange_name: str
+    symbol: str
+    side: str
+    entry_price: float
+    quantity: float
+    tp_price: float
+    sl_price: float
+    order_id: str
+    opened_at: str
+    client_order_id: Optional[str] = None
+
+class ScanApi(NamedTuple):
+    exchange_name: str
+    api_key: str
+    api_secret: str
+    passphrase: Optional[str]
+
+class ScanEntry(NamedTuple):
+    user_id: int
+    auto_trade: bool
+    apis: list
+    pairs: list     # [(symbol, timeframe), ...]
+
+# Schema migrations, applied in order by init_db. PRAGMA user_version stores how
+# many have run, so each step executes exactly once per database file.
+MIGRATIONS = [
+    # 1: secondary indexes for the scanner / position hot paths.
+    #    exchange_apis(user_id), user_symbols(user_id) and user_timeframes(user_id)
+    #    are already served by their UNIQUE(user_id, ...) autoindexes.
+    [
+        'CREATE INDEX IF NOT EXISTS idx_open_positions_user ON open_positions(user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_watched_pairs_symbol_tf ON watched_pairs(symbol, timeframe, user_id)',
+    ],
+    # 2: append-only log of signals emitted by the scanner (times in epoch ms)
+    [
+        '''CREATE TABLE IF NOT EXISTS signal_events (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            symbol TEXT,
+            timeframe TEXT,
+            side TEXT,
+            bar_ts INTEGER,
+            emitted_at INTEGER,
+            price REAL
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_signal_events_symbol ON signal_events(symbol, emitted_at)',
+        'CREATE INDEX IF NOT EXISTS idx_signal_events_user ON signal_events(user_id, emitted_at)',
+        'CREATE INDEX IF NOT EXISTS idx_signal_events_emitted ON signal_events(emitted_at)',
+    ],
+    # 3: closed-trade history + per-user / per-symbol PnL aggregates (symbol '' = all symbols)
+    [
+        '''CREATE TABLE IF NOT EXISTS trade_history (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            exchange_name TEXT,
+            symbol TEXT,
+            side TEXT,
+            entry_price REAL,
+            exit_price REAL,
+            quantity REAL,
+            gross_pnl REAL,
+            fee REAL,
+            net_pnl REAL,
+            close_reason TEXT,
+            order_id TEXT,
+            opened_at TIMESTAMP,
+            closed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_trade_history_user ON trade_history(user_id, closed_at)',
+        '''CREATE TABLE IF NOT EXISTS pnl_aggregates (
+            user_id INTEGER,
+            symbol TEXT,
+            trades INTEGER DEFAULT 0,
+            wins INTEGER DEFAULT 0,
+            gross_pnl REAL DEFAULT 0,
+            fees REAL DEFAULT 0,
+            net_pnl REAL DEFAULT 0,
+            PRIMARY KEY (user_id, symbol)
+        ) WITHOUT ROWID''',
+    ],
+    # 4: client order id of the entry order, so a re-submitted signal (same id, same
+    #    exchange order) is recorded once. NULLs (no client id) never conflict.
+    [
+        'ALTER TABLE open_positions ADD COLUMN client_order_id TEXT',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_open_positions_client_order ON open_positions(exchange_name, client_order_id)',
+    ],
+    # 5: signal counts over a time window read only that window's index range
+    #    (emitted_at, user_id); it also serves the retention purge, replacing (emitted_at)
+    [
+        'CREATE INDEX IF NOT EXISTS idx_signal_events_emitted_user ON signal_events(emitted_at, user_id)',
+        'DROP INDEX IF EXISTS idx_signal_events_emitted',
+    ],
+    # 6: key/value settings of the database itself (global file only), e.g. the
+    #    shard count its per-user rows are laid out for
+    [
+        'CREATE TABLE IF NOT EXISTS db_meta (key TEXT PRIMARY KEY, value TEXT)',
+    ],
+]
+
+async def _migrate(db):
+    async with db.execute('PRAGMA user_version') as cursor:
+        version = (await cursor.fetchone())[0]
+    for step, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        for sql in statements:
+            await db.execute(sql)
+        await db.execute(f'PRAGMA user_version = {step}')
+        logger.info(f"Applied database migration {step}.")
+
 async def init_db():
-    """Initialize the SQLite database with required tables."""
+    """Initialize the global database and every shard with the required tables."""
     try:
-        async with aiosqlite.connect(config.DB_PATH) as db:
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS exchange_apis (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    exchange_name TEXT,
-                    api_key TEXT,
-                    api_secret TEXT,
-                    passphrase TEXT,
-                    is_enabled BOOLEAN DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id),
-                    UNIQUE(user_id, exchange_name)
-                )
-            ''')
-
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS trading_config (
-                    user_id INTEGER PRIMARY KEY,
-                    leverage INTEGER DEFAULT 10,
-                    margin_qty REAL DEFAULT 10.0,
-                    margin_mode TEXT DEFAULT 'isolated',
-                    auto_trade_enabled BOOLEAN DEFAULT 0,
-                    tp_percent REAL DEFAULT 1.0,
-                    sl_percent REAL DEFAULT 1.0,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            ''')
-
-            # User's selected timeframes (separate from pairs)
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS user_timeframes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    timeframe TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id),
-                    UNIQUE(user_id, timeframe)
-                )
-            ''')
-
-            # User's selected symbols (separate from timeframes)
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS user_symbols (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    symbol TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id),
-                    UNIQUE(user_id, symbol)
-                )
-            ''')
-
-            # watched_pairs is now auto-generated from user_timeframes x user_symbols
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS watched_pairs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    symbol TEXT,
-                    timeframe TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id),
-                    UNIQUE(user_id, symbol, timeframe)
-                )
-            ''')
-
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS open_positions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    exchange_name TEXT,
-                    symbol TEXT,
-                    side TEXT,
-                    entry_price REAL,
-                    quantity REAL,
-                    tp_price REAL,
-                    sl_price REAL,
-                    order_id TEXT,
-                    opened_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            ''')
-
-            await db.commit()
-            logger.info("Database initialized successfully.")
+        for path in shards.all_paths():
+            async with db_manager.writer(path) as db:
+                await _enable_incremental_vacuum(db)
+                await _create_schema(db)
+                await _migrate(db)
+                if path == shards.global_path():
+                    await _record_shard_layout(db)
+        logger.info("Database initialized successfully.")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
 
+async def _record_shard_layout(db):
+    async with db.execute("SELECT 1 FROM db_meta WHERE key = 'db_shards'") as cursor:
+        if await cursor.fetchone():
+            return
+    # First start with a recorded layout: per-user rows still in the global file
+    # mean they were never moved to shards, whatever DB_SHARDS says now
+    layout = config.DB_SHARDS
+    if shards.is_sharded():
+        for table in shards.PER_USER_TABLES:
+            async with db.execute(f'SELECT 1 FROM {table} LIMIT 1') as cursor:
+                if await cursor.fetchone():
+                    layout = 1
+                    break
+    await db.execute("INSERT INTO db_meta (key, value) VALUES ('db_shards', ?)", (str(layout),))
+
+async def get_shard_layout():
+    """Shard count the per-user rows are stored for (recorded by init_db / migrate_shards.py), or None."""
+    async with db_manager.reader(shards.global_path()) as db:
+        async with db.execute("SELECT value FROM db_meta WHERE key = 'db_shards'") as cursor:
+            row = await cursor.fetchone()
+    return int(row[0]) if row else None
+
+async def check_shard_layout():
+    """
+    Raise RuntimeError when DB_SHARDS differs from the recorded layout: users would
+    hash to other shard files and their rows would silently disappear.
+    """
+    layout = await get_shard_layout()
+    if layout is None or layout == config.DB_SHARDS:
+        return
+    if layout == 1:
+        raise RuntimeError(f"DB_SHARDS is {config.DB_SHARDS} but the data is not sharded yet: run migrate_shards.py first")
+    raise RuntimeError(f"DB_SHARDS is {config.DB_SHARDS} but the data is split across {layout} shards "
+                       f"(changing the shard count is not supported): set DB_SHARDS back to {layout}")
+
+async def _enable_incremental_vacuum(db):
+    # auto_vacuum can only change through a full VACUUM once the file has a header
+    # (always the case here since WAL is switched on at connect). One-time cost.
+    async with db.execute('PRAGMA auto_vacuum') as cursor:
+        mode = (await cursor.fetchone())[0]
+    if mode != 2:
+        try:
+            await db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            await db.execute('VACUUM')
+            logger.info("Enabled incremental auto-vacuum.")
+        except Exception as e:
+            # Not fatal: db_maintenance skips incremental vacuum until this succeeds
+            logger.warning(f"Could not enable incremental auto-vacuum: {e}")
+
+async def _create_schema(db):
+    # Every file gets the full schema; per-user tables stay empty in the global
+    # database and cross-user tables stay empty in the shards.
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS exchange_apis (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            exchange_name TEXT,
+            api_key TEXT,
+            api_secret TEXT,
+            passphrase TEXT,
+            is_enabled BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            UNIQUE(user_id, exchange_name)
+        )
+    ''')
+
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS trading_config (
+            user_id INTEGER PRIMARY KEY,
+            leverage INTEGER DEFAULT 10,
+            margin_qty REAL DEFAULT 10.0,
+            margin_mode TEXT DEFAULT 'isolated',
+            auto_trade_enabled BOOLEAN DEFAULT 0,
+            tp_percent REAL DEFAULT 1.0,
+            sl_percent REAL DEFAULT 1.0,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    ''')
+
+    # User's selected timeframes (separate from pairs)
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS user_timeframes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            timeframe TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            UNIQUE(user_id, timeframe)
+        )
+    ''')
+
+    # User's selected symbols (separate from timeframes)
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS user_symbols (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            symbol TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            UNIQUE(user_id, symbol)
+        )
+    ''')
+
+    # watched_pairs is now auto-generated from user_timeframes x user_symbols
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS watched_pairs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            symbol TEXT,
+            timeframe TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            UNIQUE(user_id, symbol, timeframe)
+        )
+    ''')
+
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS open_positions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            exchange_name TEXT,
+            symbol TEXT,
+            side TEXT,
+            entry_price REAL,
+            quantity REAL,
+            tp_price REAL,
+            sl_price REAL,
+            order_id TEXT,
+            opened_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    ''')
+
 async def create_user(user_id):
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    # users lives in the global database, trading_config in the user's shard
+    # (the same file when unsharded); both inserts are idempotent.
+    async with db_manager.writer(shards.global_path()) as db:
         await db.execute('INSERT OR IGNORE INTO users (user_id) VALUES (?)', (user_id,))
+    async with db_manager.writer(shards.shard_path(user_id)) as db:
         await db.execute('INSERT OR IGNORE INTO trading_config (user_id) VALUES (?)', (user_id,))
-        await db.commit()
+    user_cache.invalidate(user_id, 'config')
 
 # --- Exchange APIs ---
 
 async def save_exchange_api(user_id, exchange_name, api_key, api_secret, passphrase=None):
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    async with db_manager.writer(shards.shard_path(user_id)) as db:
         await db.execute('''
             INSERT INTO exchange_apis (user_id, exchange_name, api_key, api_secret, passphrase)
             VALUES (?, ?, ?, ?, ?)
@@ -117,139 +299,410 @@ async def save_exchange_api(user_id, exchange_name, api_key, api_secret, passphr
                 api_secret=excluded.api_secret,
                 passphrase=excluded.passphrase
         ''', (user_id, exchange_name, api_key, api_secret, passphrase))
-        await db.commit()
 
 async def get_exchange_apis(user_id):
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_manager.reader(shards.shard_path(user_id)) as db:
         async with db.execute('SELECT * FROM exchange_apis WHERE user_id = ?', (user_id,)) as cursor:
             return await cursor.fetchall()
 
 async def toggle_exchange_api(user_id, exchange_name, is_enabled):
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    async with db_manager.writer(shards.shard_path(user_id)) as db:
         await db.execute('''
             UPDATE exchange_apis SET is_enabled = ? 
             WHERE user_id = ? AND exchange_name = ?
         ''', (is_enabled, user_id, exchange_name))
-        await db.commit()
 
 # --- Trading Config ---
 
 async def get_trading_config(user_id):
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    hit, cfg = user_cache.get(user_id, 'config')
+    if hit:
+        return cfg
+    token = user_cache.token()
+    async with db_manager.reader(shards.shard_path(user_id)) as db:
         async with db.execute('SELECT * FROM trading_config WHERE user_id = ?', (user_id,)) as cursor:
-            return await cursor.fetchone()
+            cfg = await cursor.fetchone()
+    user_cache.put(user_id, 'config', cfg, token)
+    return cfg
 
 async def update_trading_config(user_id, **kwargs):
     if not kwargs: return
     set_clause = ", ".join([f"{k} = ?" for k in kwargs.keys()])
     values = tuple(kwargs.values()) + (user_id,)
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    async with db_manager.writer(shards.shard_path(user_id)) as db:
         await db.execute(f'UPDATE trading_config SET {set_clause} WHERE user_id = ?', values)
-        await db.commit()
+    user_cache.invalidate(user_id, 'config')
 
 # --- User Timeframes ---
 
 async def get_user_timeframes(user_id):
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    hit, values = user_cache.get(user_id, 'timeframes')
+    if hit:
+        return list(values)
+    token = user_cache.token()
+    async with db_manager.reader(shards.shard_path(user_id)) as db:
         async with db.execute('SELECT timeframe FROM user_timeframes WHERE user_id = ?', (user_id,)) as cursor:
-            rows = await cursor.fetchall()
-            return [r[0] for r in rows]
+            values = [r[0] for r in await cursor.fetchall()]
+    user_cache.put(user_id, 'timeframes', tuple(values), token)
+    return values
 
 async def toggle_user_timeframe(user_id, timeframe):
-    """Add if not exists, remove if exists. Returns new list."""
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    """Add if not exists, remove if exists."""
+    async with db_manager.writer(shards.shard_path(user_id)) as db:
         async with db.execute('SELECT id FROM user_timeframes WHERE user_id = ? AND timeframe = ?', (user_id, timeframe)) as cursor:
             exists = await cursor.fetchone()
         if exists:
             await db.execute('DELETE FROM user_timeframes WHERE user_id = ? AND timeframe = ?', (user_id, timeframe))
         else:
             await db.execute('INSERT INTO user_timeframes (user_id, timeframe) VALUES (?, ?)', (user_id, timeframe))
-        await db.commit()
-    # Rebuild watched pairs
-    await rebuild_watched_pairs(user_id)
+        # Rebuild watched pairs
+        await _rebuild_watched_pairs(db, user_id)
+    user_cache.invalidate(user_id, 'timeframes', 'watched_pairs')
 
 async def clear_user_timeframes(user_id):
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    async with db_manager.writer(shards.shard_path(user_id)) as db:
         await db.execute('DELETE FROM user_timeframes WHERE user_id = ?', (user_id,))
-        await db.commit()
-    await rebuild_watched_pairs(user_id)
+        await _rebuild_watched_pairs(db, user_id)
+    user_cache.invalidate(user_id, 'timeframes', 'watched_pairs')
 
 # --- User Symbols ---
 
 async def get_user_symbols(user_id):
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    hit, values = user_cache.get(user_id, 'symbols')
+    if hit:
+        return list(values)
+    token = user_cache.token()
+    async with db_manager.reader(shards.shard_path(user_id)) as db:
         async with db.execute('SELECT symbol FROM user_symbols WHERE user_id = ?', (user_id,)) as cursor:
-            rows = await cursor.fetchall()
-            return [r[0] for r in rows]
+            values = [r[0] for r in await cursor.fetchall()]
+    user_cache.put(user_id, 'symbols', tuple(values), token)
+    return values
 
 async def add_user_symbol(user_id, symbol):
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        await db.execute('INSERT OR IGNORE INTO user_symbols (user_id, symbol) VALUES (?, ?)', (user_id, symbol))
-        await db.commit()
-    await rebuild_watched_pairs(user_id)
+    await add_user_symbols(user_id, [symbol])
+
+async def add_user_symbols(user_id, symbols):
+    """Add many symbols in one transaction (single watched_pairs rebuild)."""
+    if not symbols: return
+    async with db_manager.writer(shards.shard_path(user_id)) as db:
+        await db.executemany('INSERT OR IGNORE INTO user_symbols (user_id, symbol) VALUES (?, ?)',
+                             [(user_id, sym) for sym in symbols])
+        await _rebuild_watched_pairs(db, user_id)
+    user_cache.invalidate(user_id, 'symbols', 'watched_pairs')
 
 async def remove_user_symbol(user_id, symbol):
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        await db.execute('DELETE FROM user_symbols WHERE user_id = ? AND symbol = ?', (user_id, symbol))
-        await db.commit()
-    await rebuild_watched_pairs(user_id)
+    await remove_user_symbols(user_id, [symbol])
+
+async def remove_user_symbols(user_id, symbols):
+    """Remove many symbols in one transaction (single watched_pairs rebuild)."""
+    if not symbols: return
+    async with db_manager.writer(shards.shard_path(user_id)) as db:
+        await db.executemany('DELETE FROM user_symbols WHERE user_id = ? AND symbol = ?',
+                             [(user_id, sym) for sym in symbols])
+        await _rebuild_watched_pairs(db, user_id)
+    user_cache.invalidate(user_id, 'symbols', 'watched_pairs')
 
 async def clear_user_symbols(user_id):
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    async with db_manager.writer(shards.shard_path(user_id)) as db:
         await db.execute('DELETE FROM user_symbols WHERE user_id = ?', (user_id,))
-        await db.commit()
-    await rebuild_watched_pairs(user_id)
+        await _rebuild_watched_pairs(db, user_id)
+    user_cache.invalidate(user_id, 'symbols', 'watched_pairs')
 
 # --- Watched Pairs (auto-generated from timeframes x symbols) ---
 
+async def _rebuild_watched_pairs(db, user_id):
+    """
+    Sync watched_pairs to user_symbols x user_timeframes inside the caller's transaction.
+    Set-based: drop rows no longer in the product, then insert the missing ones, so
+    unchanged pairs keep their rows.
+    """
+    await db.execute('''
+        DELETE FROM watched_pairs
+        WHERE user_id = ?
+          AND (symbol NOT IN (SELECT symbol FROM user_symbols WHERE user_id = ?)
+               OR timeframe NOT IN (SELECT timeframe FROM user_timeframes WHERE user_id = ?))
+    ''', (user_id, user_id, user_id))
+    await db.execute('''
+        INSERT OR IGNORE INTO watched_pairs (user_id, symbol, timeframe)
+        SELECT s.user_id, s.symbol, t.timeframe
+        FROM user_symbols s
+        CROSS JOIN user_timeframes t
+        WHERE s.user_id = ? AND t.user_id = ?
+    ''', (user_id, user_id))
+
 async def rebuild_watched_pairs(user_id):
     """Rebuild watched_pairs as cartesian product of user_timeframes x user_symbols."""
-    timeframes = await get_user_timeframes(user_id)
-    symbols = await get_user_symbols(user_id)
-    
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        await db.execute('DELETE FROM watched_pairs WHERE user_id = ?', (user_id,))
-        for sym in symbols:
-            for tf in timeframes:
-                await db.execute('INSERT OR IGNORE INTO watched_pairs (user_id, symbol, timeframe) VALUES (?, ?, ?)', (user_id, sym, tf))
-        await db.commit()
+    async with db_manager.writer(shards.shard_path(user_id)) as db:
+        await _rebuild_watched_pairs(db, user_id)
+    user_cache.invalidate(user_id, 'watched_pairs')
 
 async def get_watched_pairs(user_id):
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    hit, rows = user_cache.get(user_id, 'watched_pairs')
+    if hit:
+        return list(rows)
+    token = user_cache.token()
+    async with db_manager.reader(shards.shard_path(user_id)) as db:
         async with db.execute('SELECT * FROM watched_pairs WHERE user_id = ?', (user_id,)) as cursor:
-            return await cursor.fetchall()
+            rows = await cursor.fetchall()
+    user_cache.put(user_id, 'watched_pairs', tuple(rows), token)
+    return rows
+
+async def _iter_shards(read_page, start, key, page_size):
+    """
+    Stream read_page(path, after) over every shard in keyset pages, where key(item)
+    is the keyset value of an item. The first page of every shard is read
+    concurrently; the remaining pages of each shard follow one at a time.
+    """
+    paths = shards.all_shard_paths()
+    firsts = await asyncio.gather(*(read_page(path, start) for path in paths))
+    for path, page in zip(paths, firsts):
+        while True:
+            for item in page:
+                yield item
+            if len(page) < page_size:
+                break
+            page = await read_page(path, key(page[-1]))
+
+def _iter_pages(sql, record, page_size):
+    """
+    Stream `sql` (which must select id first and take (after_id, limit) params)
+    from every shard in keyset pages, yielding record(*row). Each page is one
+    short read; the reader connection is returned between pages.
+    """
+    async def read_page(path, after):
+        async with db_manager.reader(path) as db:
+            async with db.execute(sql, (after, page_size)) as cursor:
+                return [record(*row) for row in await cursor.fetchall()]
+    return _iter_shards(read_page, 0, lambda item: item[0], page_size)
+
+def iter_all_watched_pairs(page_size=None):
+    """Async iterator over every watched pair (WatchedPair records), page by page."""
+    return _iter_pages(
+        'SELECT id, user_id, symbol, timeframe FROM watched_pairs WHERE id > ? ORDER BY id LIMIT ?',
+        WatchedPair, page_size or config.DB_PAGE_SIZE
+    )
 
 async def get_all_watched_pairs():
-    """Used by scanner to get all pairs watched by all users"""
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute('SELECT * FROM watched_pairs') as cursor:
+    """All pairs watched by all users, as a list (prefer iter_all_watched_pairs for large tables)"""
+    return [pair async for pair in iter_all_watched_pairs()]
+
+# --- Scanner ---
+
+def iter_scan_plan(page_size=None):
+    """
+    Everything the scanner needs, streamed one user at a time as ScanEntry records.
+    Users are read in pages of page_size (keyset on user_id); each page is one
+    read transaction so its config, API and pair rows are consistent. Only users
+    with watched pairs and a trading_config row are included; API rows are only
+    loaded for users with auto-trade enabled.
+    """
+    page_size = page_size or config.DB_PAGE_SIZE
+    return _iter_shards(lambda path, after: _read_scan_page(path, after, page_size), -1,
+                        lambda entry: entry.user_id, page_size)
+
+async def _read_scan_page(path, after, page_size):
+    async with db_manager.reader(path) as db:
+        # Explicit read transaction so all three queries see the same snapshot
+        # (the reader pool rolls it back when the connection is returned).
+        await db.execute('BEGIN')
+        async with db.execute('''
+            SELECT user_id, auto_trade_enabled FROM trading_config
+            WHERE user_id > ? AND EXISTS (SELECT 1 FROM watched_pairs w WHERE w.user_id = trading_config.user_id)
+            ORDER BY user_id LIMIT ?
+        ''', (after, page_size)) as cursor:
+            users = await cursor.fetchall()
+        if not users:
+            return []
+        entries = {user_id: ScanEntry(user_id, bool(auto), [], []) for user_id, auto in users}
+        bounds = (users[0][0], users[-1][0])
+        async with db.execute('''
+            SELECT user_id, symbol, timeframe FROM watched_pairs
+            WHERE user_id BETWEEN ? AND ?
+        ''', bounds) as cursor:
+            async for user_id, symbol, timeframe in cursor:
+                entry = entries.get(user_id)
+                if entry is not None:
+                    entry.pairs.append((symbol, timeframe))
+        async with db.execute('''
+            SELECT a.user_id, a.exchange_name, a.api_key, a.api_secret, a.passphrase
+            FROM exchange_apis a JOIN trading_config c ON c.user_id = a.user_id
+            WHERE a.user_id BETWEEN ? AND ? AND a.is_enabled AND c.auto_trade_enabled
+        ''', bounds) as cursor:
+            async for user_id, *api in cursor:
+                entry = entries.get(user_id)
+                if entry is not None:
+                    entry.apis.append(ScanApi(*api))
+    return list(entries.values())
+
+# --- Signal Events ---
+
+async def insert_signal_events(events):
+    """events: [(user_id, symbol, timeframe, side, bar_ts, emitted_at, price), ...] written in one transaction."""
+    if not events: return
+    async with db_manager.writer(shards.global_path()) as db:
+        await db.executemany('''
+            INSERT INTO signal_events (user_id, symbol, timeframe, side, bar_ts, emitted_at, price)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', events)
+
+async def get_recent_signals(symbol, limit=20):
+    """Last N signals for a symbol, newest first."""
+    async with db_manager.reader(shards.global_path()) as db:
+        async with db.execute('''
+            SELECT * FROM signal_events WHERE symbol = ?
+            ORDER BY emitted_at DESC, id DESC LIMIT ?
+        ''', (symbol, limit)) as cursor:
             return await cursor.fetchall()
 
+async def get_signal_counts(user_id=None, since_ms=0):
+    """Signal counts per user (or for one user) emitted at or after since_ms: [(user_id, count), ...]."""
+    async with db_manager.reader(shards.global_path()) as db:
+        if user_id:
+            sql = 'SELECT user_id, COUNT(*) FROM signal_events WHERE user_id = ? AND emitted_at >= ?'
+            params = (user_id, since_ms)
+        else:
+            # Without the hint the planner walks the whole (user_id, emitted_at) index for the GROUP BY
+            sql = ('SELECT user_id, COUNT(*) FROM signal_events INDEXED BY idx_signal_events_emitted_user '
+                   'WHERE emitted_at >= ? GROUP BY user_id')
+            params = (since_ms,)
+        async with db.execute(sql, params) as cursor:
+            return [(r[0], r[1]) for r in await cursor.fetchall() if r[0] is not None]
+
+async def purge_signal_events(before_ms, batch_size=5000):
+    """Delete one batch of events older than before_ms. Returns rows deleted (0 when done)."""
+    async with db_manager.writer(shards.global_path()) as db:
+        cursor = await db.execute('''
+            DELETE FROM signal_events WHERE id IN (
+                SELECT id FROM signal_events WHERE emitted_at < ? LIMIT ?
+            )
+        ''', (before_ms, batch_size))
+        return cursor.rowcount
+
 # --- Open Positions ---
 
-async def add_open_position(user_id, exchange_name, symbol, side, entry_price, quantity, tp_price, sl_price, order_id):
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        await db.execute('''
-            INSERT INTO open_positions (user_id, exchange_name, symbol, side, entry_price, quantity, tp_price, sl_price, order_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, exchange_name, symbol, side, entry_price, quantity, tp_price, sl_price, order_id))
-        await db.commit()
+async def add_open_position(user_id, exchange_name, symbol, side, entry_price, quantity, tp_price, sl_price, order_id,
+                            client_order_id=None):
+    """Record a new position; returns False when this client order id is already recorded."""
+    async with db_manager.writer(shards.shard_path(user_id)) as db:
+        cursor = await db.execute('''
+            INSERT INTO open_positions (user_id, exchange_name, symbol, side, entry_price, quantity, tp_price, sl_price,
+                                        order_id, client_order_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(exchange_name, client_order_id) DO NOTHING
+        ''', (user_id, exchange_name, symbol, side, entry_price, quantity, tp_price, sl_price, order_id, client_order_id))
+        return cursor.rowcount > 0
 
 async def get_open_positions(user_id=None):
-    async with aiosqlite.connect(config.DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        if user_id:
-            async with db.execute('SELECT * FROM open_positions WHERE user_id = ?', (user_id,)) as cursor:
-                return await cursor.fetchall()
-        else:
-            async with db.execute('SELECT * FROM open_positions') as cursor:
-                return await cursor.fetchall()
-
-async def remove_open_position(pos_id):
-    async with aiosqlite.connect(config.DB_PATH) as db:
+    """Open positions (OpenPosition records) of one user, or of everyone."""
+    if user_id:
+        async with db_manager.reader(shards.shard_path(user_id)) as db:
+            async with db.execute(f'SELECT {", ".join(OpenPosition._fields)} FROM open_positions WHERE user_id = ?',
+                                  (user_id,)) as cursor:
+                return [OpenPosition(*row) for row in await cursor.fetchall()]
+    return [pos async for pos in iter_open_positions()]
+
+async def get_open_position_by_client_order(user_id, exchange_name, client_order_id):
+    """The open position recorded for this client order id (an OpenPosition), or None."""
+    async with db_manager.reader(shards.shard_path(user_id)) as db:
+        async with db.execute(f'SELECT {", ".join(OpenPosition._fields)} FROM open_positions '
+                              'WHERE exchange_name = ? AND client_order_id = ? AND user_id = ?',
+                              (exchange_name, client_order_id, user_id)) as cursor:
+            row = await cursor.fetchone()
+    return OpenPosition(*row) if row else None
+
+def iter_open_positions(page_size=None):
+    """Async iterator over every open position (OpenPosition records), page by page."""
+    return _iter_pages(
+        f'SELECT {", ".join(OpenPosition._fields)} FROM open_positions WHERE id > ? ORDER BY id LIMIT ?',
+        OpenPosition, page_size or config.DB_PAGE_SIZE
+    )
+
+def _position_path(user_id):
+    # Position ids are only unique within one shard file
+    if user_id is None:
+        if shards.is_sharded():
+            raise ValueError("user_id is required to address a position when DB_SHARDS > 1")
+        return shards.global_path()
+    return shards.shard_path(user_id)
+
+async def close_open_position(pos_id, exit_price, fee=0.0, reason='MANUAL', user_id=None):
+    """
+    Move an open position to trade_history and update the user's PnL aggregates,
+    all in one transaction. Returns the history row as a dict, or None if the
+    position no longer exists. user_id is required when the database is sharded.
+    """
+    async with db_manager.writer(_position_path(user_id)) as db:
+        return await _close_position(db, pos_id, exit_price, fee, reason)
+
+async def close_open_positions(closes):
+    """
+    Batch version of close_open_position for [(user_id, pos_id, exit_price, fee, reason), ...]:
+    one transaction per database file (a single one when unsharded). Returns the
+    history rows of the positions that still existed.
+    """
+    by_path = {}
+    for user_id, pos_id, exit_price, fee, reason in closes:
+        by_path.setdefault(shards.shard_path(user_id), []).append((pos_id, exit_price, fee, reason))
+    trades = []
+    for path, items in by_path.items():
+        async with db_manager.writer(path) as db:
+            for pos_id, exit_price, fee, reason in items:
+                trade = await _close_position(db, pos_id, exit_price, fee, reason)
+                if trade:
+                    trades.append(trade)
+    return trades
+
+async def _close_position(db, pos_id, exit_price, fee, reason):
+    async with db.execute('SELECT * FROM open_positions WHERE id = ?', (pos_id,)) as cursor:
+        pos = await cursor.fetchone()
+    if not pos:
+        return None
+    direction = 1 if pos['side'] == 'LONG' else -1
+    gross_pnl = (exit_price - pos['entry_price']) * pos['quantity'] * direction
+    net_pnl = gross_pnl - fee
+    trade = {
+        'user_id': pos['user_id'], 'exchange_name': pos['exchange_name'], 'symbol': pos['symbol'],
+        'side': pos['side'], 'entry_price': pos['entry_price'], 'exit_price': exit_price,
+        'quantity': pos['quantity'], 'gross_pnl': gross_pnl, 'fee': fee, 'net_pnl': net_pnl,
+        'close_reason': reason, 'order_id': pos['order_id'], 'opened_at': pos['opened_at'],
+    }
+    await db.execute('''
+        INSERT INTO trade_history (user_id, exchange_name, symbol, side, entry_price, exit_price, quantity,
+                                   gross_pnl, fee, net_pnl, close_reason, order_id, opened_at)
+        VALUES (:user_id, :exchange_name, :symbol, :side, :entry_price, :exit_price, :quantity,
+                :gross_pnl, :fee, :net_pnl, :close_reason, :order_id, :opened_at)
+    ''', trade)
+    win = 1 if net_pnl > 0 else 0
+    await db.executemany('''
+        INSERT INTO pnl_aggregates (user_id, symbol, trades, wins, gross_pnl, fees, net_pnl)
+        VALUES (?, ?, 1, ?, ?, ?, ?)
+        ON CONFLICT(user_id, symbol) DO UPDATE SET
+            trades = trades + 1,
+            wins = wins + excluded.wins,
+            gross_pnl = gross_pnl + excluded.gross_pnl,
+            fees = fees + excluded.fees,
+            net_pnl = net_pnl + excluded.net_pnl
+    ''', [(pos['user_id'], sym, win, gross_pnl, fee, net_pnl) for sym in ('', pos['symbol'])])
+    await db.execute('DELETE FROM open_positions WHERE id = ?', (pos_id,))
+    return trade
+
+async def get_pnl_summary(user_id, top=10):
+    """(total aggregate row or None, [per-symbol rows by net PnL desc]) — reads only aggregate rows."""
+    async with db_manager.reader(shards.shard_path(user_id)) as db:
+        async with db.execute("SELECT * FROM pnl_aggregates WHERE user_id = ? AND symbol = ''", (user_id,)) as cursor:
+            total = await cursor.fetchone()
+        async with db.execute('''
+            SELECT * FROM pnl_aggregates WHERE user_id = ? AND symbol != ''
+            ORDER BY net_pnl DESC LIMIT ?
+        ''', (user_id, top)) as cursor:
+            per_symbol = await cursor.fetchall()
+    return total, per_symbol
+
+async def remove_open_position(pos_id, user_id=None):
+    async with db_manager.writer(_position_path(user_id)) as db:
         await db.execute('DELETE FROM open_positions WHERE id = ?', (pos_id,))
-        await db.commit()
+
+async def close_db():
+    """Close the process-wide connections (called on bot shutdown)."""
+    await db_manager.close_all()
+    user_cache.clear()
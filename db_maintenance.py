@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import os
+import time
+
+import config
+import db_manager
+import shards
+
+logger = logging.getLogger(__name__)
+
+# ══════════════════════════════════════════════════════
+#  db_maintenance.py  —  Bảo trì SQLite định kỳ
+#  Mỗi DB_MAINTENANCE_INTERVAL giây, khi DB đang rảnh (không có ghi
+#  trong DB_QUIET_SECONDS): PRAGMA optimize + ANALYZE, incremental
+#  vacuum trả các trang trống về hệ điều hành, checkpoint(TRUNCATE)
+#  để thu nhỏ file WAL. Ghi log dung lượng trước/sau và thời gian.
+# ══════════════════════════════════════════════════════
+
+def file_sizes(path):
+    """(database bytes, WAL bytes) — missing files count as 0."""
+    sizes = []
+    for name in (path, path + "-wal"):
+        try:
+            sizes.append(os.path.getsize(name))
+        except OSError:
+            sizes.append(0)
+    return tuple(sizes)
+
+async def _pragma_value(db, pragma):
+    async with db.execute(f"PRAGMA {pragma}") as cursor:
+        row = await cursor.fetchone()
+    return row[0] if row else None
+
+async def _wait_quiet(manager):
+    """Wait until the writer has been idle for DB_QUIET_SECONDS (at most DB_QUIET_MAX_WAIT)."""
+    deadline = time.monotonic() + config.DB_QUIET_MAX_WAIT
+    while time.monotonic() < deadline:
+        idle = manager.idle_seconds()
+        if idle >= config.DB_QUIET_SECONDS:
+            return True
+        await asyncio.sleep(max(1.0, config.DB_QUIET_SECONDS - idle))
+    return False
+
+async def maintain(path):
+    """Run one maintenance pass on a database file; returns {step: seconds}."""
+    manager = db_manager.get_manager(path)
+    quiet = await _wait_quiet(manager)
+    db_before, wal_before = file_sizes(path)
+    timings = {}
+
+    t0 = time.perf_counter()
+    async with manager.writer() as db:
+        await db.execute(f"PRAGMA analysis_limit={config.DB_ANALYSIS_LIMIT}")
+        await db.execute("ANALYZE")
+        await db.execute("PRAGMA optimize")
+    timings["analyze"] = time.perf_counter() - t0
+
+    # Release free pages in batches so scanner / bot writes can interleave
+    t0 = time.perf_counter()
+    freed = 0
+    while True:
+        async with manager.writer() as db:
+            if await _pragma_value(db, "auto_vacuum") != 2:
+                break
+            free = await _pragma_value(db, "freelist_count")
+            if not free:
+                break
+            batch = min(free, config.DB_VACUUM_BATCH_PAGES)
+            # executescript steps the pragma to completion (execute() frees one page)
+            await db.executescript(f"PRAGMA incremental_vacuum({batch});")
+            freed += batch
+        await asyncio.sleep(0)
+    timings["incremental_vacuum"] = time.perf_counter() - t0
+
+    # TRUNCATE only when nobody was writing; otherwise a PASSIVE checkpoint never blocks
+    t0 = time.perf_counter()
+    mode = "TRUNCATE" if quiet else "PASSIVE"
+    async with manager.writer() as db:
+        async with db.execute(f"PRAGMA wal_checkpoint({mode})") as cursor:
+            busy, wal_pages, moved = await cursor.fetchone()
+    timings["checkpoint"] = time.perf_counter() - t0
+
+    db_after, wal_after = file_sizes(path)
+    logger.info(
+        f"DB maintenance {os.path.basename(path)}: "
+        f"db {db_before / 1e6:.2f}→{db_after / 1e6:.2f} MB, wal {wal_before / 1e6:.2f}→{wal_after / 1e6:.2f} MB, "
+        f"freed {freed} page(s), checkpoint {mode} busy={busy} ({moved}/{wal_pages} pages) | "
+        + ", ".join(f"{step} {seconds * 1000:.0f} ms" for step, seconds in timings.items())
+    )
+    return timings
+
+async def db_maintenance_task():
+    """Background task started from bot.post_init."""
+    while True:
+        await asyncio.sleep(config.DB_MAINTENANCE_INTERVAL)
+        for path in shards.all_paths():
+            try:
+                await maintain(path)
+            except Exception as e:
+                logger.error(f"DB maintenance error on {path}: {e}")
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+import aiosqlite
+import config
+
+logger = logging.getLogger(__name__)
+
+# Applied to every connection. WAL lets readers run alongside the single writer;
+# synchronous=NORMAL is durable across app crashes in WAL mode (only an OS crash
+# can lose the last commits).
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA cache_size=-{config.DB_CACHE_KB}",
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA busy_timeout={config.DB_BUSY_TIMEOUT_MS}",
+)
+
+class ConnectionManager:
+    """
+    Long-lived connections to one SQLite file: a single writer (serialized by a
+    lock, one transaction at a time) plus a small pool of reader connections.
+    Each sqlite3 connection keeps its own prepared-statement cache.
+    """
+    def __init__(self, path, readers=None):
+        self.path = path
+        self.n_readers = readers or config.DB_READERS
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._readers: asyncio.Queue = asyncio.Queue()
+        self._all_readers = []
+        self._open_lock = asyncio.Lock()
+        self._opened = False
+        self._last_write = time.monotonic()
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(self.path, cached_statements=config.DB_STATEMENT_CACHE)
+        conn.row_factory = aiosqlite.Row
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def open(self):
+        async with self._open_lock:
+            if self._opened:
+                return
+            self._writer = await self._connect()
+            for _ in range(self.n_readers):
+                conn = await self._connect()
+                self._all_readers.append(conn)
+                self._readers.put_nowait(conn)
+            self._opened = True
+            logger.info(f"Opened SQLite {self.path} (1 writer, {self.n_readers} readers, WAL).")
+
+    @asynccontextmanager
+    async def writer(self):
+        """Exclusive write transaction: commits on success, rolls back on error."""
+        if not self._opened:
+            await self.open()
+        async with self._write_lock:
+            try:
+                yield self._writer
+                await self._writer.commit()  # type: ignore[union-attr]
+            except BaseException:
+                await self._writer.rollback()  # type: ignore[union-attr]
+                raise
+            finally:
+                self._last_write = time.monotonic()
+
+    def idle_seconds(self):
+        """Seconds since the last write transaction finished (0 while one is running)."""
+        if self._write_lock.locked():
+            return 0.0
+        return time.monotonic() - self._last_write
+
+    @asynccontextmanager
+    async def reader(self):
+        if not self._opened:
+            await self.open()
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            # Never hand a connection back in the middle of a read transaction
+            if conn.in_transaction:
+                await conn.rollback()
+            self._readers.put_nowait(conn)
+
+    async def close(self):
+        async with self._open_lock:
+            if not self._opened:
+                return
+            async with self._write_lock:
+                await self._writer.close()  # type: ignore[union-attr]
+            for conn in self._all_readers:
+                await conn.close()
+            self._all_readers.clear()
+            self._readers = asyncio.Queue()
+            self._writer = None
+            self._opened = False
+            logger.info(f"Closed SQLite {self.path}.")
+
+# One manager per database file, created on first use
+_managers = {}
+
+def get_manager(path=None) -> ConnectionManager:
+    path = path or config.DB_PATH
+    manager = _managers.get(path)
+    if manager is None:
+        manager = _managers[path] = ConnectionManager(path)
+    return manager
+
+def writer(path=None):
+    return get_manager(path).writer()
+
+def reader(path=None):
+    return get_manager(path).reader()
+
+async def close_all():
+    for manager in list(_managers.values()):
+        await manager.close()
+    _managers.clear()
@@ -4,6 +4,8 @@ from .bingx_exchange import BingxExchange
 from .bybit_exchange import BybitExchange
 from .mexc_exchange import MexcExchange
 from .okx_exchange import OkxExchange
+from .paper_exchange import PaperExchange
+import market_cache
 
 def get_exchange_instance(exchange_name, api_key, api_secret, passphrase=None):
     exchanges = {
@@ -11,10 +13,13 @@ def get_exchange_instance(exchange_name, api_key, api_secret, passphrase=None):
         "BingX": BingxExchange,
         "Bybit": BybitExchange,
         "MEXC": MexcExchange,
-        "OKX": OkxExchange
+        "OKX": OkxExchange,
+        "Paper": PaperExchange
     }
     
     cls = exchanges.get(exchange_name)
     if cls:
-         return cls(api_key, api_secret, passphrase)
+         instance = cls(api_key, api_secret, passphrase)
+         market_cache.attach(exchange_name, instance)
+         return instance
     return None
@@ -1,12 +1,93 @@
+import asyncio
+import logging
+import time
 from abc import ABC, abstractmethod
 from typing import Any, Optional
 
+import ccxt.async_support as ccxt
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Last leverage / margin mode confirmed by each account, shared by every adapter
+# instance in the process: {(adapter class, api_key): {'seeded': bool, 'symbols': {symbol: {field: (value, confirmed_at)}}}}
+# Entries expire after EXCHANGE_SETTINGS_TTL so changes made outside the bot are picked up.
+_account_settings: dict = {}
+
 class BaseExchange(ABC):
+    # False for adapters whose tickers are read from price_cache (nothing to feed back into it)
+    live_prices = True
+    # True for adapters whose TP/SL are standalone orders that outlive the position:
+    # cancel_protection must be called once the position is closed
+    protection_orders = False
+
     def __init__(self, api_key: str, api_secret: str, passphrase: Optional[str] = None):
         self.api_key = api_key
         self.api_secret = api_secret
         self.passphrase = passphrase
 
+    def _account(self) -> dict:
+        key = (type(self).__name__, self.api_key)
+        account = _account_settings.get(key)
+        if account is None:
+            account = _account_settings[key] = {'seeded': False, 'symbols': {}}
+        return account
+
+    async def _seed_settings(self, account: dict) -> None:
+        """Prime the cache from the exchange once per account (ccxt fetchLeverages, where supported)."""
+        account['seeded'] = True
+        client = getattr(self, 'exchange', None)
+        if not config.SEED_EXCHANGE_SETTINGS or client is None or client.has.get('fetchLeverages') is not True:
+            return
+        try:
+            leverages = await client.fetch_leverages()
+        except Exception as e:
+            logger.warning(f"{type(self).__name__}: could not seed leverage settings: {e}")
+            return
+        now = time.monotonic()
+        for symbol, info in leverages.items():
+            settings = account['symbols'].setdefault(symbol, {})
+            if info.get('marginMode'):
+                settings['margin_mode'] = (info['marginMode'].lower(), now)
+            # Only trust a single leverage value (hedge mode can differ per side)
+            if info.get('longLeverage') and info.get('longLeverage') == info.get('shortLeverage'):
+                settings['leverage'] = (int(info['longLeverage']), now)
+
+    async def _ensure(self, symbol: str, field: str, value, apply) -> bool:
+        account = self._account()
+        if not account['seeded']:
+            await self._seed_settings(account)
+        settings = account['symbols'].setdefault(symbol, {})
+        cached = settings.get(field)
+        if cached and cached[0] == value and time.monotonic() - cached[1] < config.EXCHANGE_SETTINGS_TTL:
+            return True
+        ok = await apply()
+        if ok:
+            settings[field] = (value, time.monotonic())
+        return ok
+
+    async def ensure_leverage(self, symbol: str, leverage: int) -> bool:
+        """set_leverage, skipped when the account is already known to use this leverage."""
+        return await self._ensure(symbol, 'leverage', int(leverage), lambda: self.set_leverage(symbol, leverage))
+
+    async def ensure_margin_mode(self, symbol: str, mode: str) -> bool:
+        """set_margin_mode, skipped when the account is already known to use this mode."""
+        async def apply():
+            ok = await self.set_margin_mode(symbol, mode)
+            # Some exchanges reset leverage when the margin mode changes
+            self._account()['symbols'].get(symbol, {}).pop('leverage', None)
+            return ok
+        return await self._ensure(symbol, 'margin_mode', mode.lower(), apply)
+
+    def invalidate_settings(self, symbol: Optional[str] = None) -> None:
+        """Forget cached settings (e.g. after the exchange rejected an order) so they are sent again."""
+        symbols = self._account()['symbols']
+        if symbol is None:
+            symbols.clear()
+        else:
+            symbols.pop(symbol, None)
+
     @abstractmethod
     async def initialize(self) -> None:
         """Initialize connection"""
@@ -25,6 +106,14 @@ class BaseExchange(ABC):
         """
         ...
 
+    @abstractmethod
+    async def get_tickers(self, symbols: list) -> dict:
+        """
+        Return last traded prices for many symbols in one request.
+        Format: {'BTC/USDT:USDT': 65000.0, ...}
+        """
+        ...
+
     @abstractmethod
     async def set_leverage(self, symbol: str, leverage: int) -> bool:
         """Set leverage for a symbol"""
@@ -36,14 +125,97 @@ class BaseExchange(ABC):
         ...
 
     @abstractmethod
-    async def open_position(self, symbol: str, side: str, quantity: float, leverage: int, margin_mode: str) -> Any:
+    async def open_position(self, symbol: str, side: str, quantity: float, leverage: int, margin_mode: str,
+                            tp_price: Optional[float] = None, sl_price: Optional[float] = None,
+                            client_order_id: Optional[str] = None) -> Any:
         """
         Open a new position.
         Side: 'LONG' or 'SHORT'
+        tp_price / sl_price: optional take-profit / stop-loss trigger prices, placed on
+        the exchange together with the entry so they hold even while the bot is down.
+        client_order_id: makes the order idempotent (see _submit_order).
         Return dict with order ID and details.
         """
         ...
 
+    async def fetch_order_by_client_id(self, symbol: str, client_order_id: str) -> Optional[dict]:
+        """Look an order up by the client id it was sent with; None if the exchange doesn't know it."""
+        try:
+            return await self.exchange.fetch_order(None, symbol, params={'clientOrderId': client_order_id})  # type: ignore[attr-defined]
+        except ccxt.OrderNotFound:
+            return None
+
+    async def _submit_order(self, symbol: str, client_order_id: Optional[str], send) -> Any:
+        """
+        Run send() (which places the order) with quick retries on transient errors.
+        Before each retry, and after the last failure, the order is looked up by its
+        client id, so a request that did reach the exchange is never placed twice.
+        Without a client id nothing is retried.
+        """
+        for attempt in range(config.ORDER_RETRIES + 1):
+            try:
+                return await send()
+            except ccxt.DuplicateOrderId:
+                # An earlier attempt went through after all
+                order = await self.fetch_order_by_client_id(symbol, client_order_id)  # type: ignore[arg-type]
+                if order:
+                    return order
+                raise
+            except ccxt.NetworkError as e:  # timeouts, exchange unavailable, rate limits
+                # Rate limits are handled by the execution queue, not retried here
+                if not client_order_id or isinstance(e, ccxt.DDoSProtection):
+                    raise
+                await asyncio.sleep(config.ORDER_RETRY_DELAY * 2 ** attempt)
+                try:
+                    order = await self.fetch_order_by_client_id(symbol, client_order_id)
+                except Exception:
+                    # Can't tell whether it was placed: don't risk a duplicate
+                    raise e
+                if order:
+                    logger.info(f"{type(self).__name__}: order {client_order_id} found after {type(e).__name__}")
+                    return order
+                if attempt == config.ORDER_RETRIES:
+                    raise
+                logger.warning(f"{type(self).__name__}: retrying order {client_order_id} after {type(e).__name__}: {e}")
+
+    def order_amount(self, symbol: str, base_qty: float, price: float) -> Optional[tuple]:
+        """
+        Size an order from a quantity of the base currency: converted to contracts and
+        truncated to the market's amount precision. Returns (amount to send, base quantity
+        it represents), or None when it is below the market's minimum amount or notional.
+        Without market metadata (see market_cache) the quantity is returned unchanged.
+        """
+        client = getattr(self, 'exchange', None)
+        market = client.markets.get(symbol) if client is not None and client.markets else None
+        if market is None:
+            return base_qty, base_qty
+        contract_size = float(market.get('contractSize') or 1)
+        try:
+            amount = float(client.amount_to_precision(symbol, base_qty / contract_size))  # type: ignore[union-attr]
+        except ccxt.InvalidOrder:
+            return None
+        limits = market.get('limits') or {}
+        min_amount = (limits.get('amount') or {}).get('min')
+        min_cost = (limits.get('cost') or {}).get('min')
+        if min_amount and amount < min_amount:
+            return None
+        if min_cost and amount * contract_size * price < min_cost:
+            return None
+        return amount, amount * contract_size
+
+    @staticmethod
+    def _attached_tp_sl(tp_price: Optional[float] = None, sl_price: Optional[float] = None) -> dict:
+        """ccxt unified params that attach TP/SL trigger orders to an entry order."""
+        params = {}
+        if tp_price is not None:
+            params['takeProfit'] = {'triggerPrice': tp_price}
+        if sl_price is not None:
+            params['stopLoss'] = {'triggerPrice': sl_price}
+        return params
+
+    async def cancel_protection(self, symbol: str, client_order_id: str) -> None:
+        """Cancel the TP/SL orders placed with the entry sent as client_order_id (see protection_orders)."""
+
     @abstractmethod
     async def close_position(self, symbol: str, side: str) -> Any:
         """
@@ -52,6 +224,14 @@ class BaseExchange(ABC):
         """
         ...
 
+    @abstractmethod
+    async def get_positions(self) -> list:
+        """
+        Return every open position on the account in one request
+        (ccxt position dicts: symbol, side 'long'/'short', contracts, entryPrice...).
+        """
+        ...
+
     @abstractmethod
     async def get_balance(self) -> float:
         """Return USDT balance"""
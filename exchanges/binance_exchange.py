@@ -1,7 +1,17 @@
+import logging
+
 import ccxt.async_support as ccxt
 from .base_exchange import BaseExchange
 
+logger = logging.getLogger(__name__)
+
+# Binance futures error codes for a clientOrderId that is already in use
+DUPLICATE_ORDER_CODES = ('-4116', '-4015')
+
 class BinanceExchange(BaseExchange):
+    # closePosition STOP_MARKET / TAKE_PROFIT_MARKET orders stay open after the position is gone
+    protection_orders = True
+
     def __init__(self, api_key, api_secret, passphrase=None):
         super().__init__(api_key, api_secret, passphrase)
         self.exchange = ccxt.binance({
@@ -30,6 +40,10 @@ class BinanceExchange(BaseExchange):
         ohlcv = await self.exchange.fetch_ohlcv(symbol, interval, limit=limit)
         return ohlcv
 
+    async def get_tickers(self, symbols):
+        tickers = await self.exchange.fetch_tickers(symbols)
+        return {symbol: float(t['last']) for symbol, t in tickers.items() if t.get('last') is not None}
+
     async def set_leverage(self, symbol, leverage):
         try:
              await self.exchange.set_leverage(leverage, symbol)
@@ -52,15 +66,70 @@ class BinanceExchange(BaseExchange):
             print(f"Binance set_margin_mode error: {e}")
             return False
 
-    async def open_position(self, symbol, side, quantity, leverage, margin_mode):
-        await self.set_margin_mode(symbol, margin_mode)
-        await self.set_leverage(symbol, leverage)
+    async def open_position(self, symbol, side, quantity, leverage, margin_mode, tp_price=None, sl_price=None, client_order_id=None):
+        await self.ensure_margin_mode(symbol, margin_mode)
+        await self.ensure_leverage(symbol, leverage)
         
         # side: 'LONG' -> buy, 'SHORT' -> sell
         # binance mode: One-way by default, or hedge
         order_side = 'buy' if side == 'LONG' else 'sell'
         
-        return await self.exchange.create_market_order(symbol, order_side, quantity)
+        try:
+            if tp_price is None and sl_price is None:
+                params = {'clientOrderId': client_order_id} if client_order_id else {}
+                return await self._submit_order(
+                    symbol, client_order_id,
+                    lambda: self.exchange.create_market_order(symbol, order_side, quantity, params=params)
+                )
+            return await self._submit_order(
+                symbol, client_order_id,
+                lambda: self._open_with_tp_sl(symbol, order_side, quantity, tp_price, sl_price, client_order_id)
+            )
+        except Exception:
+            # The account may not match the cached leverage / margin mode: send them again next time
+            self.invalidate_settings(symbol)
+            raise
+
+    async def _open_with_tp_sl(self, symbol, order_side, quantity, tp_price, sl_price, client_order_id=None):
+        # Binance futures has no attached TP/SL: send the entry plus closePosition
+        # STOP_MARKET / TAKE_PROFIT_MARKET orders in one batch request
+        close_side = 'sell' if order_side == 'buy' else 'buy'
+        orders = [{'symbol': symbol, 'type': 'market', 'side': order_side, 'amount': quantity,
+                   'params': {'clientOrderId': client_order_id} if client_order_id else {}}]
+        for key, price, suffix in (('stopLossPrice', sl_price, 's'), ('takeProfitPrice', tp_price, 't')):
+            if price is not None:
+                params = {key: price, 'closePosition': True}
+                if client_order_id:
+                    params['clientOrderId'] = client_order_id + suffix
+                orders.append({'symbol': symbol, 'type': 'market', 'side': close_side, 'amount': quantity,
+                               'params': params})
+        results = await self.exchange.create_orders(orders)
+        entry, protection = results[0], results[1:]
+        if not entry.get('id'):
+            # Entry rejected: don't leave the protective orders behind
+            for order in protection:
+                if order.get('id'):
+                    await self.exchange.cancel_order(order['id'], symbol)
+            # Batch results carry per-order {code, msg} instead of raising: surface a duplicate
+            # client id (an earlier attempt went through) so _submit_order looks the order up
+            code = str((entry.get('info') or {}).get('code'))
+            if code in DUPLICATE_ORDER_CODES:
+                raise ccxt.DuplicateOrderId(f"Binance entry order {client_order_id} already exists: {entry.get('info')}")
+            raise ccxt.ExchangeError(f"Binance entry order rejected: {entry.get('info')}")
+        for order in protection:
+            if not order.get('id'):
+                # The position monitor still closes at the stored levels
+                logger.warning(f"Binance TP/SL order for {symbol} rejected, position only protected by the monitor: "
+                               f"{order.get('info')}")
+        return entry
+
+    async def cancel_protection(self, symbol, client_order_id):
+        # Both legs, by the client ids _open_with_tp_sl gave them; the one that fired is already gone
+        for suffix in ('s', 't'):
+            try:
+                await self.exchange.cancel_order(None, symbol, params={'origClientOrderId': client_order_id + suffix})
+            except ccxt.OrderNotFound:
+                pass
 
     async def close_position(self, symbol, side):
         # We need to find the open position size
@@ -73,6 +142,10 @@ class BinanceExchange(BaseExchange):
                 return await self.exchange.create_market_order(symbol, close_side, amount, params={'reduceOnly': True})
         return None
 
+    async def get_positions(self):
+        positions = await self.exchange.fetch_positions()
+        return [p for p in positions if float(p.get('contracts') or 0) > 0]
+
     async def get_balance(self):
         balance = await self.exchange.fetch_balance()
         return balance['total'].get('USDT', 0.0)
@@ -28,6 +28,10 @@ class BybitExchange(BaseExchange):
         ohlcv = await self.exchange.fetch_ohlcv(symbol, interval, limit=limit)
         return ohlcv
 
+    async def get_tickers(self, symbols):
+        tickers = await self.exchange.fetch_tickers(symbols)
+        return {symbol: float(t['last']) for symbol, t in tickers.items() if t.get('last') is not None}
+
     async def set_leverage(self, symbol, leverage):
         try:
              await self.exchange.set_leverage(leverage, symbol)
@@ -48,18 +52,40 @@ class BybitExchange(BaseExchange):
              print(f"Bybit set_margin_mode error: {e}")
              return False
 
-    async def open_position(self, symbol, side, quantity, leverage, margin_mode):
-        await self.set_margin_mode(symbol, margin_mode)
-        await self.set_leverage(symbol, leverage)
+    async def open_position(self, symbol, side, quantity, leverage, margin_mode, tp_price=None, sl_price=None, client_order_id=None):
+        await self.ensure_margin_mode(symbol, margin_mode)
+        await self.ensure_leverage(symbol, leverage)
         
         # side: 'LONG' -> buy, 'SHORT' -> sell
         order_side = 'buy' if side == 'LONG' else 'sell'
         
-        params = {}
+        # Attached TP/SL (Bybit stopLoss / takeProfit fields on the entry order)
+        params = self._attached_tp_sl(tp_price, sl_price)
         # Bybit also has position_idx for hedge mode (0: One-Way, 1: Buy side, 2: Sell side)
         # Assuming one-way mode for Bybit by default, or CCXT handles it
         
-        return await self.exchange.create_market_order(symbol, order_side, quantity, params=params)
+        if client_order_id:
+            params['clientOrderId'] = client_order_id
+        
+        try:
+            return await self._submit_order(
+                symbol, client_order_id,
+                lambda: self.exchange.create_market_order(symbol, order_side, quantity, params=params)
+            )
+        except Exception:
+            # The account may not match the cached leverage / margin mode: send them again next time
+            self.invalidate_settings(symbol)
+            raise
+
+    async def fetch_order_by_client_id(self, symbol, client_order_id):
+        # Unified accounts: ccxt's fetch_order needs an order id, query realtime orders by orderLinkId instead
+        await self.exchange.load_markets()
+        market = self.exchange.market(symbol)
+        response = await self.exchange.privateGetV5OrderRealtime({
+            'category': 'linear', 'symbol': market['id'], 'orderLinkId': client_order_id,
+        })
+        orders = (response.get('result') or {}).get('list') or []
+        return self.exchange.parse_order(orders[0], market) if orders else None
 
     async def close_position(self, symbol, side):
         positions = await self.exchange.fetch_positions([symbol])
@@ -71,6 +97,10 @@ class BybitExchange(BaseExchange):
                 return await self.exchange.create_market_order(symbol, close_side, amount, params={'reduceOnly': True})
         return None
 
+    async def get_positions(self):
+        positions = await self.exchange.fetch_positions()
+        return [p for p in positions if float(p.get('contracts') or 0) > 0]
+
     async def get_balance(self):
         balance = await self.exchange.fetch_balance()
         return balance['total'].get('USDT', 0.0)
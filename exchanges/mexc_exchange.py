@@ -27,6 +27,10 @@ class MexcExchange(BaseExchange):
         ohlcv = await self.exchange.fetch_ohlcv(symbol, interval, limit=limit)
         return ohlcv
 
+    async def get_tickers(self, symbols):
+        tickers = await self.exchange.fetch_tickers(symbols)
+        return {symbol: float(t['last']) for symbol, t in tickers.items() if t.get('last') is not None}
+
     async def set_leverage(self, symbol, leverage):
         try:
              await self.exchange.set_leverage(leverage, symbol)
@@ -43,13 +47,46 @@ class MexcExchange(BaseExchange):
              print(f"MEXC set_margin_mode error: {e}")
              return False
 
-    async def open_position(self, symbol, side, quantity, leverage, margin_mode):
-        await self.set_margin_mode(symbol, margin_mode)
-        await self.set_leverage(symbol, leverage)
+    async def open_position(self, symbol, side, quantity, leverage, margin_mode, tp_price=None, sl_price=None, client_order_id=None):
+        await self.ensure_margin_mode(symbol, margin_mode)
+        await self.ensure_leverage(symbol, leverage)
         
         order_side = 'buy' if side == 'LONG' else 'sell'
         
-        return await self.exchange.create_market_order(symbol, order_side, quantity)
+        # MEXC contract orders take stopLossPrice / takeProfitPrice directly (ccxt passes them through)
+        params = {}
+        if tp_price is not None or sl_price is not None:
+            await self.exchange.load_markets()
+        if tp_price is not None:
+            params['takeProfitPrice'] = self.exchange.price_to_precision(symbol, tp_price)
+        if sl_price is not None:
+            params['stopLossPrice'] = self.exchange.price_to_precision(symbol, sl_price)
+        
+        if client_order_id:
+            params['clientOrderId'] = client_order_id
+        
+        try:
+            return await self._submit_order(
+                symbol, client_order_id,
+                lambda: self.exchange.create_market_order(symbol, order_side, quantity, params=params)
+            )
+        except Exception:
+            # The account may not match the cached leverage / margin mode: send them again next time
+            self.invalidate_settings(symbol)
+            raise
+
+    async def fetch_order_by_client_id(self, symbol, client_order_id):
+        # Contract orders are looked up by externalOid (ccxt maps clientOrderId to it when placing)
+        await self.exchange.load_markets()
+        market = self.exchange.market(symbol)
+        try:
+            response = await self.exchange.contractPrivateGetOrderExternalSymbolExternalOid({
+                'symbol': market['id'], 'external_oid': client_order_id,
+            })
+        except ccxt.OrderNotFound:
+            return None
+        order = response.get('data')
+        return self.exchange.parse_order(order, market) if order else None
 
     async def close_position(self, symbol, side):
         positions = await self.exchange.fetch_positions([symbol])
@@ -61,6 +98,10 @@ class MexcExchange(BaseExchange):
                 return await self.exchange.create_market_order(symbol, close_side, amount, params={'reduceOnly': True})
         return None
 
+    async def get_positions(self):
+        positions = await self.exchange.fetch_positions()
+        return [p for p in positions if float(p.get('contracts') or 0) > 0]
+
     async def get_balance(self):
         balance = await self.exchange.fetch_balance()
         return balance['total'].get('USDT', 0.0)
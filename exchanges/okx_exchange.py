@@ -28,6 +28,10 @@ class OkxExchange(BaseExchange):
         ohlcv = await self.exchange.fetch_ohlcv(symbol, interval, limit=limit)
         return ohlcv
 
+    async def get_tickers(self, symbols):
+        tickers = await self.exchange.fetch_tickers(symbols)
+        return {symbol: float(t['last']) for symbol, t in tickers.items() if t.get('last') is not None}
+
     async def set_leverage(self, symbol, leverage):
         try:
              await self.exchange.set_leverage(leverage, symbol)
@@ -40,16 +44,29 @@ class OkxExchange(BaseExchange):
         # OKX margin mode is set per order actually, or through account config
         return True
 
-    async def open_position(self, symbol, side, quantity, leverage, margin_mode):
-        await self.set_leverage(symbol, leverage)
+    async def open_position(self, symbol, side, quantity, leverage, margin_mode, tp_price=None, sl_price=None, client_order_id=None):
+        await self.ensure_leverage(symbol, leverage)
         
         order_side = 'buy' if side == 'LONG' else 'sell'
         
         params = {
              'tdMode': 'isolated' if margin_mode.lower() == 'isolated' else 'cross'
         }
+        # Attached TP/SL (OKX attachAlgoOrds on the entry order)
+        params.update(self._attached_tp_sl(tp_price, sl_price))
+        
+        if client_order_id:
+            params['clientOrderId'] = client_order_id
         
-        return await self.exchange.create_market_order(symbol, order_side, quantity, params=params)
+        try:
+            return await self._submit_order(
+                symbol, client_order_id,
+                lambda: self.exchange.create_market_order(symbol, order_side, quantity, params=params)
+            )
+        except Exception:
+            # The account may not match the cached leverage / margin mode: send them again next time
+            self.invalidate_settings(symbol)
+            raise
 
     async def close_position(self, symbol, side):
         positions = await self.exchange.fetch_positions([symbol])
@@ -66,6 +83,10 @@ class OkxExchange(BaseExchange):
                 return await self.exchange.create_market_order(symbol, close_side, amount, params=params)
         return None
 
+    async def get_positions(self):
+        positions = await self.exchange.fetch_positions()
+        return [p for p in positions if float(p.get('contracts') or 0) > 0]
+
     async def get_balance(self):
         balance = await self.exchange.fetch_balance()
         return balance['total'].get('USDT', 0.0)
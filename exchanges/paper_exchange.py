@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+
+import ccxt.async_support as ccxt
+
+import config
+import market_cache
+import price_cache
+from .base_exchange import BaseExchange
+
+logger = logging.getLogger(__name__)
+
+# Simulated accounts shared by every PaperExchange instance in the process, keyed by api_key
+# ("paper-<user_id>"): {api_key: {'balance': USDT, 'positions': {symbol: position}, 'orders': {client id: order}}}
+_accounts: dict = {}
+_loaded = False
+_dirty = False
+
+def _load():
+    global _loaded
+    _loaded = True
+    try:
+        with open(config.PAPER_STATE_PATH, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable paper state {config.PAPER_STATE_PATH}: {e}")
+        return
+    for key, account in data.items():
+        _accounts.setdefault(key, account)
+
+def save():
+    """Write every simulated account to PAPER_STATE_PATH (atomic replace)."""
+    global _dirty
+    if not _loaded:
+        return
+    tmp = f"{config.PAPER_STATE_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(_accounts, f)
+        os.replace(tmp, config.PAPER_STATE_PATH)
+        _dirty = False
+    except Exception as e:
+        logger.error(f"Could not save paper accounts: {e}")
+
+async def paper_task():
+    """Background task: persist the simulated accounts every PAPER_SAVE_INTERVAL seconds when they changed."""
+    while True:
+        await asyncio.sleep(config.PAPER_SAVE_INTERVAL)
+        if _dirty:
+            save()
+
+class PaperExchange(BaseExchange):
+    # Market orders fill at the scanner's cached price plus PAPER_SLIPPAGE; nothing is sent anywhere.
+    # Its tickers come from price_cache, so they must not be written back to it.
+    live_prices = False
+
+    def _state(self):
+        if not _loaded:
+            _load()
+        account = _accounts.get(self.api_key)
+        if account is None:
+            account = _accounts[self.api_key] = {'balance': config.PAPER_START_BALANCE, 'positions': {}, 'orders': {}}
+        return account
+
+    async def initialize(self):
+        pass
+
+    async def get_futures_symbols(self):
+        # Same symbols as the scanner's price source
+        return list(market_cache.get('Binance') or {})
+
+    async def get_klines(self, symbol, interval, limit=200):
+        # No market data of its own: the scanner's Binance candles drive paper accounts
+        return []
+
+    async def get_tickers(self, symbols):
+        prices = {symbol: price_cache.get(symbol) for symbol in symbols}
+        return {symbol: price for symbol, price in prices.items() if price}
+
+    async def set_leverage(self, symbol, leverage):
+        return True
+
+    async def set_margin_mode(self, symbol, mode):
+        return True
+
+    def _fill(self, symbol, order_side, amount, leverage=1, margin_mode='cross', reduce_only=False,
+              client_order_id=None, trigger_price=None):
+        """Simulated market fill on a one-way account: opposite-side amounts reduce the position first."""
+        global _dirty
+        price = trigger_price or price_cache.get(symbol)
+        if not price:
+            raise ccxt.ExchangeError(f"Paper: no recent price for {symbol}")
+        account = self._state()
+        fill = price * (1 + config.PAPER_SLIPPAGE if order_side == 'buy' else 1 - config.PAPER_SLIPPAGE)
+        direction = 'long' if order_side == 'buy' else 'short'
+        pos = account['positions'].get(symbol)
+
+        closing = min(amount, pos['contracts']) if pos and pos['side'] != direction else 0.0
+        opening = 0.0 if reduce_only else amount - closing
+        if reduce_only and not closing:
+            return None
+        fee = fill * (closing + opening) * config.PAPER_FEE_RATE
+        if opening:
+            used = sum(p['contracts'] * p['entryPrice'] / p['leverage'] for p in account['positions'].values())
+            if fill * opening / leverage + fee > account['balance'] - used:
+                raise ccxt.InsufficientFunds(f"Paper: balance {account['balance']:.2f} USDT is not enough for {symbol}")
+
+        realized = 0.0
+        if closing:
+            realized = (fill - pos['entryPrice']) * closing * (1 if pos['side'] == 'long' else -1)
+            pos['contracts'] -= closing
+            if pos['contracts'] <= 1e-12:
+                del account['positions'][symbol]
+                pos = None
+        if opening:
+            if pos:
+                total = pos['contracts'] + opening
+                pos['entryPrice'] = (pos['entryPrice'] * pos['contracts'] + fill * opening) / total
+                pos['contracts'] = total
+            else:
+                account['positions'][symbol] = {
+                    'side': direction, 'contracts': opening, 'entryPrice': fill, 'leverage': leverage,
+                    'marginMode': margin_mode, 'takeProfitPrice': None, 'stopLossPrice': None,
+                }
+        account['balance'] += realized - fee
+
+        order = {
+            'id': uuid.uuid4().hex[:16], 'clientOrderId': client_order_id, 'timestamp': int(time.time() * 1000),
+            'symbol': symbol, 'type': 'market', 'side': order_side, 'amount': closing + opening,
+            'filled': closing + opening, 'price': fill, 'average': fill, 'status': 'closed',
+            'fee': {'cost': fee, 'currency': 'USDT'}, 'reduceOnly': reduce_only,
+        }
+        if client_order_id:
+            orders = account['orders']
+            orders[client_order_id] = order
+            while len(orders) > config.PAPER_ORDER_HISTORY:
+                del orders[next(iter(orders))]
+        _dirty = True
+        return order
+
+    def _settle(self):
+        """Simulate the exchange-side TP/SL: close positions whose cached price crossed a level, at that level."""
+        account = self._state()
+        for symbol, pos in list(account['positions'].items()):
+            price = price_cache.get(symbol)
+            if not price:
+                continue
+            sign = 1 if pos['side'] == 'long' else -1
+            tp, sl = pos.get('takeProfitPrice'), pos.get('stopLossPrice')
+            level = tp if tp and sign * (price - tp) >= 0 else sl if sl and sign * (price - sl) <= 0 else None
+            if level:
+                self._fill(symbol, 'sell' if pos['side'] == 'long' else 'buy', pos['contracts'],
+                           reduce_only=True, trigger_price=level)
+
+    async def open_position(self, symbol, side, quantity, leverage, margin_mode, tp_price=None, sl_price=None, client_order_id=None):
+        self._settle()
+        account = self._state()
+        # Same client id, same order (see BaseExchange._submit_order)
+        if client_order_id and client_order_id in account['orders']:
+            return account['orders'][client_order_id]
+        order = self._fill(symbol, 'buy' if side == 'LONG' else 'sell', quantity, leverage, margin_mode.lower(),
+                           client_order_id=client_order_id)
+        pos = account['positions'].get(symbol)
+        if pos and (tp_price is not None or sl_price is not None):
+            pos['takeProfitPrice'], pos['stopLossPrice'] = tp_price, sl_price
+        return order
+
+    async def fetch_order_by_client_id(self, symbol, client_order_id):
+        return self._state()['orders'].get(client_order_id)
+
+    async def close_position(self, symbol, side):
+        # A TP/SL the price already crossed closes the position at its level first
+        self._settle()
+        pos = self._state()['positions'].get(symbol)
+        if not pos:
+            return None
+        return self._fill(symbol, 'sell' if pos['side'] == 'long' else 'buy', pos['contracts'], reduce_only=True)
+
+    async def get_positions(self):
+        self._settle()
+        return [dict(pos, symbol=symbol) for symbol, pos in self._state()['positions'].items()]
+
+    async def get_balance(self):
+        self._settle()
+        return self._state()['balance']
+
+    async def close_connection(self):
+        pass
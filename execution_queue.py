@@ -0,0 +1,136 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+
+import ccxt.async_support as ccxt
+import numpy as np
+
+import config
+from rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# ══════════════════════════════════════════════════════
+#  execution_queue.py  —  Hàng đợi gọi API dùng chung theo sàn
+#  Mỗi sàn có một PriorityQueue, một nhóm worker và một token
+#  bucket theo giới hạn request của sàn (tính theo IP của máy chủ,
+#  nên dùng chung cho mọi user). Lệnh (ORDER) luôn được xử lý
+#  trước các request phụ (HOUSEKEEPING: giá, nến...).
+# ══════════════════════════════════════════════════════
+
+ORDER = 0
+HOUSEKEEPING = 1
+
+class ExchangeQueue:
+    """Priority queue + worker pool + token bucket for one exchange."""
+    def __init__(self, name, rate, capacity, workers):
+        self.name = name
+        self.bucket = TokenBucket(rate, capacity)
+        self.n_workers = workers
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._workers = []
+        self.paused_until = 0.0
+        self.waits = {ORDER: deque(maxlen=config.LATENCY_SAMPLES), HOUSEKEEPING: deque(maxlen=config.LATENCY_SAMPLES)}
+
+    def submit(self, call, priority, weight):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.n_workers)]
+        future = asyncio.get_running_loop().create_future()
+        # seq keeps FIFO order within a priority (and avoids comparing callables)
+        self._queue.put_nowait((priority, next(self._seq), time.monotonic(), call, weight, future))
+        return future
+
+    async def _work(self):
+        while True:
+            # Take a token before picking a job, so whichever job is most urgent
+            # when capacity frees up gets it (not the one that happened to be dequeued first)
+            await self.bucket.acquire(1)
+            priority, _, queued_at, call, weight, future = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    # Our token predates the venue's 429: wait out the backoff and take a fresh one
+                    await asyncio.sleep(pause)
+                    await self.bucket.acquire(1)
+                if weight > 1:
+                    await self.bucket.acquire(weight - 1)
+                # The caller may have given up while we waited (deadline, shutdown): never send it then
+                if future.cancelled():
+                    continue
+                self.waits[priority].append(time.monotonic() - queued_at)
+                try:
+                    result = await call()
+                except (ccxt.RateLimitExceeded, ccxt.DDoSProtection) as e:
+                    # The venue says we're over its limit: stop everyone on this exchange for a while
+                    self.bucket.drain(config.EXECUTION_BACKOFF_SECONDS)
+                    self.paused_until = time.monotonic() + config.EXECUTION_BACKOFF_SECONDS
+                    logger.warning(f"{self.name} rate limited, pausing {config.EXECUTION_BACKOFF_SECONDS}s: {e}")
+                    if not future.done():
+                        future.set_exception(e)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    def stats(self):
+        """{'queued': n, 'order': (samples, p50 ms, p95 ms), 'housekeeping': (...)}"""
+        summary = {'queued': self._queue.qsize()}
+        for priority, label in ((ORDER, 'order'), (HOUSEKEEPING, 'housekeeping')):
+            waits = self.waits[priority]
+            if waits:
+                ms = np.asarray(waits) * 1000
+                summary[label] = (len(ms), float(np.percentile(ms, 50)), float(np.percentile(ms, 95)))
+        return summary
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+_queues = {}
+
+def _queue_for(exchange_name):
+    queue = _queues.get(exchange_name)
+    if queue is None:
+        rate, capacity = config.EXECUTION_LIMITS.get(exchange_name, config.EXECUTION_DEFAULT_LIMIT)
+        queue = _queues[exchange_name] = ExchangeQueue(exchange_name, rate, capacity, config.EXECUTION_WORKERS)
+    return queue
+
+async def submit(exchange_name, call, priority=HOUSEKEEPING, weight=1):
+    """
+    Run `call` (an async function taking no arguments) through the exchange's queue
+    and return its result. Cancelling the caller before a worker picks the call up
+    means it never runs.
+    """
+    future = _queue_for(exchange_name).submit(call, priority, weight)
+    return await future
+
+def stats():
+    return {name: queue.stats() for name, queue in _queues.items()}
+
+async def report_task():
+    """Background task: log queue depth and wait times per exchange."""
+    while True:
+        await asyncio.sleep(config.EXECUTION_REPORT_INTERVAL)
+        for name, summary in stats().items():
+            parts = [f"queued {summary['queued']}"]
+            for label in ('order', 'housekeeping'):
+                if label in summary:
+                    n, p50, p95 = summary[label]
+                    parts.append(f"{label} wait p50 {p50:.0f} ms / p95 {p95:.0f} ms (n={n})")
+            logger.info(f"Execution queue {name}: " + ", ".join(parts))
+
+async def close():
+    for queue in _queues.values():
+        await queue.close()
+    _queues.clear()
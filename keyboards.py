@@ -27,6 +27,7 @@ def get_main_menu_keyboard():
         ],
         # ── Làm mới ────────────────────────────────
         [
+            InlineKeyboardButton("📊 Lãi / Lỗ",        callback_data="menu_pnl"),
             InlineKeyboardButton("🔄 Làm mới",         callback_data="menu_refresh"),
         ],
     ]
@@ -67,6 +68,7 @@ _EX_ICONS = {
     "Bybit":   "🟠",
     "MEXC":    "🟣",
     "OKX":     "⬜",
+    "Paper":   "📝",
 }
 
 def get_exchange_list_keyboard(exchanges, current_apis=[]):
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+import config
+import exchanges
+import execution_queue
+
+logger = logging.getLogger(__name__)
+
+# ══════════════════════════════════════════════════════
+#  market_cache.py  —  Thông tin market của từng sàn (dùng chung toàn tiến trình)
+#  precision, số lượng / giá trị lệnh tối thiểu, contract size.
+#  Tải một lần (load_markets) rồi lưu ra file JSON, hết hạn sau
+#  MARKET_CACHE_TTL. Mỗi adapter mới được gắn sẵn markets (set_markets)
+#  nên lệnh không bao giờ phải chờ load_markets.
+# ══════════════════════════════════════════════════════
+
+# {exchange_name: {'loaded_at': unix time, 'markets': {symbol: ccxt market}}}
+_markets = {}
+_locks = {}
+_disk_read = False
+
+def _read_file():
+    global _disk_read
+    _disk_read = True
+    try:
+        with open(config.MARKET_CACHE_PATH, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable market cache {config.MARKET_CACHE_PATH}: {e}")
+        return
+    for name, entry in data.items():
+        if name not in _markets:
+            _markets[name] = entry
+
+def _write_file():
+    tmp = f"{config.MARKET_CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(_markets, f)
+        os.replace(tmp, config.MARKET_CACHE_PATH)
+    except Exception as e:
+        logger.warning(f"Could not save market cache: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+def _fresh(entry):
+    return time.time() - entry['loaded_at'] < config.MARKET_CACHE_TTL
+
+async def _fetch(exchange_name):
+    """One load_markets on an anonymous client; only linear contract markets are kept."""
+    adapter = exchanges.get_exchange_instance(exchange_name, "", "")
+    if adapter is None:
+        return None
+    client = getattr(adapter, 'exchange', None)
+    if client is None:
+        # Simulated venues (Paper) have no markets of their own
+        return None
+    try:
+        markets = await execution_queue.submit(exchange_name, lambda: client.load_markets(True), weight=5)
+    finally:
+        await adapter.close_connection()
+    return {symbol: m for symbol, m in markets.items() if m.get('contract') and m.get('linear')}
+
+async def load(exchange_name, refresh=False):
+    """
+    Markets of one exchange: from memory, else the cache file, else one load_markets.
+    Entries older than MARKET_CACHE_TTL are reloaded; if that fails the old ones are kept.
+    """
+    if not _disk_read:
+        _read_file()
+    lock = _locks.setdefault(exchange_name, asyncio.Lock())
+    async with lock:
+        entry = _markets.get(exchange_name)
+        if entry and _fresh(entry) and not refresh:
+            return entry['markets']
+        try:
+            markets = await _fetch(exchange_name)
+        except Exception as e:
+            logger.warning(f"Market cache: load_markets failed on {exchange_name}: {e}")
+            return entry['markets'] if entry else None
+        if not markets:
+            return entry['markets'] if entry else None
+        _markets[exchange_name] = {'loaded_at': time.time(), 'markets': markets}
+        _write_file()
+        logger.info(f"Market cache: {len(markets)} {exchange_name} markets loaded.")
+        return markets
+
+def get(exchange_name):
+    """Cached markets (possibly past their TTL, precision rarely changes) or None; never hits the network."""
+    if not _disk_read:
+        _read_file()
+    entry = _markets.get(exchange_name)
+    return entry['markets'] if entry else None
+
+def attach(exchange_name, adapter):
+    """Give an adapter's ccxt client the cached markets, so its own load_markets returns immediately."""
+    client = getattr(adapter, 'exchange', None)
+    if client is None or client.markets:
+        return
+    markets = get(exchange_name)
+    if markets:
+        client.set_markets(markets)
+
+async def market_cache_task():
+    """Background task: keep every supported exchange's markets loaded and fresh."""
+    while True:
+        for name in config.SUPPORTED_EXCHANGES:
+            await load(name)
+        await asyncio.sleep(config.MARKET_CACHE_REFRESH_INTERVAL)
@@ -0,0 +1,88 @@
+"""
+Chuyển dữ liệu theo user từ DB_PATH (một file) sang các file shard.
+
+Chạy sau khi đặt DB_SHARDS > 1 trên một database đã có dữ liệu, khi bot đang dừng:
+    DB_SHARDS=4 python migrate_shards.py
+
+Mỗi bảng trong shards.PER_USER_TABLES được copy sang shard của user rồi xoá
+khỏi DB global, tất cả trong một transaction (lỗi giữa chừng thì không đổi gì).
+Dòng trùng với dữ liệu đã có trong shard (trùng id, hoặc trading_config mặc định
+do bot tạo khi đã chạy với DB_SHARDS > 1) làm dừng migration thay vì bị bỏ qua.
+Chạy lại nhiều lần cũng an toàn: không còn dòng nào để chuyển.
+
+Chỉ hỗ trợ 1 file -> DB_SHARDS shard. Số shard được ghi vào DB global (db_meta);
+đổi DB_SHARDS khi dữ liệu đã chia shard (VD 4 -> 8) bị từ chối, vì user sẽ
+rơi sang file shard khác và mất dữ liệu.
+"""
+
+import asyncio
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+import database
+import shards
+
+def migrate():
+    conn = sqlite3.connect(shards.global_path(), isolation_level=None)
+    conn.create_function("shard_of", 1, shards.shard_index, deterministic=True)
+    try:
+        for i, path in enumerate(shards.all_shard_paths()):
+            conn.execute("ATTACH DATABASE ? AS s" + str(i), (path,))
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT value FROM main.db_meta WHERE key = 'db_shards'").fetchone()
+        layout = int(row[0]) if row else 1
+        if layout not in (1, config.DB_SHARDS):
+            raise RuntimeError(f"dữ liệu đang chia theo {layout} shard, không hỗ trợ đổi sang {config.DB_SHARDS} "
+                               f"(chỉ chuyển được từ 1 file); đặt lại DB_SHARDS = {layout}")
+        moved = {}
+        for table in shards.PER_USER_TABLES:
+            columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA main.table_info({table})"))
+            expected = conn.execute(f"SELECT COUNT(*) FROM main.{table}").fetchone()[0]
+            total = 0
+            for i in range(config.DB_SHARDS):
+                try:
+                    cursor = conn.execute(
+                        f"INSERT INTO s{i}.{table} ({columns}) "
+                        f"SELECT {columns} FROM main.{table} WHERE shard_of(user_id) = ?", (i,)
+                    )
+                except sqlite3.IntegrityError as e:
+                    raise RuntimeError(f"{table}: dòng trùng với dữ liệu đã có trong shard {i} ({e}), không chuyển gì") from e
+                total += cursor.rowcount
+            # Chỉ xoá khỏi DB global khi mọi dòng đã sang shard
+            if total != expected:
+                raise RuntimeError(f"{table}: chỉ chuyển được {total}/{expected} dòng, không chuyển gì")
+            conn.execute(f"DELETE FROM main.{table}")
+            moved[table] = total
+        conn.execute("INSERT OR REPLACE INTO main.db_meta (key, value) VALUES ('db_shards', ?)", (str(config.DB_SHARDS),))
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return moved
+
+async def main():
+    if not shards.is_sharded():
+        print("DB_SHARDS = 1: không có gì để chuyển.")
+        return 1
+    # Tạo schema + migration cho DB global và mọi file shard
+    await database.init_db()
+    await database.close_db()
+    try:
+        moved = migrate()
+    except RuntimeError as e:
+        print(f"Lỗi: {e}")
+        return 1
+    for table, count in moved.items():
+        print(f"  {table:<16} {count:>8} dòng")
+    print(f"Đã chuyển dữ liệu sang {config.DB_SHARDS} shard.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
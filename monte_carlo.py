@@ -0,0 +1,94 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# ══════════════════════════════════════════════════════
+#  monte_carlo.py  —  Phân tích độ bền kết quả backtest
+#  Lấy mẫu lại danh sách lệnh từ run_backtest (bootstrap
+#  hoặc xáo trộn thứ tự) để ước lượng khoảng tin cậy cho
+#  win rate, PNL net, max drawdown và xác suất cháy vốn.
+# ══════════════════════════════════════════════════════
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# Số đường mô phỏng mỗi lô — giới hạn bộ nhớ ở mức chunk_size × số lệnh
+CHUNK_SIZE = 5000
+
+def _path_stats(pnl_paths, initial_capital, ruin_level):
+    """Thống kê cho từng đường: (win rate %, PNL net, max drawdown %, cháy vốn?)."""
+    equity = initial_capital + np.cumsum(pnl_paths, axis=1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), initial_capital)
+    max_dd = ((peak - equity) / peak).max(axis=1) * 100
+    win_rate = (pnl_paths > 0).mean(axis=1) * 100
+    net_pnl = equity[:, -1] - initial_capital
+    ruined = equity.min(axis=1) <= ruin_level
+    return win_rate, net_pnl, max_dd, ruined
+
+def run_monte_carlo(trades, n_paths=20000, method='bootstrap', initial_capital=10000.0, order_size=1000.0,
+                    base_order_size=1000.0, ruin_fraction=0.5, seed=None):
+    """
+    trades: DataFrame từ run_backtest (cần cột 'pnl') hoặc mảng PNL từng lệnh.
+    method: 'bootstrap' (lấy mẫu có hoàn lại) hoặc 'shuffle' (hoán vị thứ tự lệnh).
+    order_size: volume mỗi lệnh muốn đánh giá; PNL được co giãn từ base_order_size
+                (volume đã dùng khi backtest) vì PNL và phí tỉ lệ tuyến tính với volume.
+    ruin_fraction: cháy vốn khi vốn chạm initial_capital × (1 - ruin_fraction).
+    """
+    pnl = trades['pnl'].to_numpy(dtype=float) if isinstance(trades, pd.DataFrame) else np.asarray(trades, dtype=float)
+    if len(pnl) == 0:
+        return None
+    if method not in ('bootstrap', 'shuffle'):
+        raise ValueError(f"Unknown resampling method: {method}")
+
+    pnl = pnl * (order_size / base_order_size)
+    ruin_level = initial_capital * (1 - ruin_fraction)
+    rng = np.random.default_rng(seed)
+
+    parts = []
+    done = 0
+    while done < n_paths:
+        size = min(CHUNK_SIZE, n_paths - done)
+        if method == 'bootstrap':
+            paths = rng.choice(pnl, size=(size, len(pnl)), replace=True)
+        else:
+            paths = rng.permuted(np.broadcast_to(pnl, (size, len(pnl))), axis=1)
+        parts.append(_path_stats(paths, initial_capital, ruin_level))
+        done += size
+
+    win_rate, net_pnl, max_dd, ruined = (np.concatenate(col) for col in zip(*parts))
+    pct = lambda arr: dict(zip(PERCENTILES, np.percentile(arr, PERCENTILES)))
+    return {
+        'method': method,
+        'n_paths': n_paths,
+        'n_trades': len(pnl),
+        'win_rate': pct(win_rate),
+        'net_pnl': pct(net_pnl),
+        'max_drawdown': pct(max_dd),
+        'ruin_probability': float(ruined.mean() * 100),
+        'ruin_level': ruin_level,
+    }
+
+def print_report(report):
+    if not report:
+        print("Không có lệnh để phân tích")
+        return
+    header = "  ".join(f"P{p:<9}" for p in PERCENTILES)
+    print("-" * 50)
+    print(f"MONTE CARLO ({report['method']}): {report['n_paths']} đường × {report['n_trades']} lệnh")
+    print(f"{'':<16}{header}")
+    for label, key, fmt in (("Win Rate %", 'win_rate', "{:<10.2f}"),
+                            ("PNL Net $", 'net_pnl', "{:<10.2f}"),
+                            ("Max DD %", 'max_drawdown', "{:<10.2f}")):
+        row = "  ".join(fmt.format(report[key][p]) for p in PERCENTILES)
+        print(f"{label:<16}{row}")
+    print(f"Xác suất cháy vốn (vốn ≤ ${report['ruin_level']:.2f}): {report['ruin_probability']:.2f}%")
+    print("-" * 50)
+
+if __name__ == "__main__":
+    from run_local_backtest import run_backtest
+    trades = run_backtest(symbol='BTC/USDT', timeframe='15m', days=90)
+    if trades is not None:
+        print_report(run_monte_carlo(trades, method='bootstrap'))
+        print_report(run_monte_carlo(trades, method='shuffle'))
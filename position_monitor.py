@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+
+import numpy as np
+from telegram.ext import Application
+
+import config
+import database
+import execution_queue
+import price_cache
+from exchanges import get_exchange_instance
+
+logger = logging.getLogger(__name__)
+
+# ══════════════════════════════════════════════════════
+#  position_monitor.py  —  Theo dõi TP/SL của các vị thế đang mở
+#  Mỗi chu kỳ: gom vị thế theo sàn, lấy giá bằng MỘT lệnh
+#  fetch_tickers cho mỗi sàn, so sánh TP/SL bằng numpy cho toàn bộ
+#  vị thế, rồi đóng những vị thế đã chạm mức.
+# ══════════════════════════════════════════════════════
+
+# One anonymous (public data) client per exchange, reused across cycles
+_ticker_clients = {}
+
+def _ticker_client(exchange_name):
+    client = _ticker_clients.get(exchange_name)
+    if client is None:
+        client = get_exchange_instance(exchange_name, "", "")
+        if client:
+            _ticker_clients[exchange_name] = client
+    return client
+
+def triggered(sides, prices, tp, sl):
+    """
+    Vectorized TP/SL check. sides: +1 LONG / -1 SHORT.
+    Returns (hit_tp, hit_sl) boolean arrays; NaN prices never trigger.
+    Signed distances make LONG and SHORT the same comparison.
+    """
+    with np.errstate(invalid="ignore"):
+        hit_tp = sides * (prices - tp) >= 0
+        hit_sl = sides * (prices - sl) <= 0
+    return hit_tp, hit_sl & ~hit_tp
+
+async def _prices_for(exchange_name, positions):
+    """{symbol: last price} for every symbol held on one exchange, in one request."""
+    client = _ticker_client(exchange_name)
+    if not client:
+        return {}
+    symbols = sorted({p.symbol for p in positions})
+    try:
+        prices = await execution_queue.submit(exchange_name, lambda: client.get_tickers(symbols))
+        if client.live_prices:
+            price_cache.update_many(prices)
+        return prices
+    except Exception as e:
+        logger.error(f"Position monitor: fetch_tickers failed on {exchange_name}: {e}")
+        return {}
+
+async def _close(pos, price, reason, tg_application):
+    apis = await database.get_exchange_apis(pos.user_id)
+    api = next((a for a in apis if a['exchange_name'] == pos.exchange_name), None)
+    exchange = api and get_exchange_instance(api['exchange_name'], api['api_key'], api['api_secret'], api['passphrase'])
+    if not exchange:
+        logger.warning(f"Position monitor: no {pos.exchange_name} API for user {pos.user_id}, cannot close {pos.symbol}")
+        return
+    exit_price, fee = price, 0.0
+    try:
+        # None means the exchange has no position left (closed elsewhere): record it at the ticker price
+        order = await execution_queue.submit(
+            pos.exchange_name, lambda: exchange.close_position(pos.symbol, pos.side),
+            priority=execution_queue.ORDER, weight=2
+        )
+        if order:
+            exit_price = float(order.get('average') or price)
+            fee = float((order.get('fee') or {}).get('cost') or 0.0)
+        if exchange.protection_orders and pos.client_order_id:
+            # A leftover closePosition order would close the next position on this symbol
+            try:
+                await execution_queue.submit(
+                    pos.exchange_name, lambda: exchange.cancel_protection(pos.symbol, pos.client_order_id),
+                    priority=execution_queue.ORDER, weight=2
+                )
+            except Exception as e:
+                logger.error(f"Position monitor: cancelling TP/SL of {pos.symbol} for {pos.user_id} on {pos.exchange_name} failed: {e}")
+    finally:
+        await exchange.close_connection()
+    trade = await database.close_open_position(pos.id, exit_price, fee=fee, reason=reason, user_id=pos.user_id)
+    if not trade:
+        return
+    logger.info(f"User {pos.user_id} {reason} hit: closed {pos.symbol} {pos.side} on {pos.exchange_name} @ {exit_price}")
+    icon = "🎯" if reason == "TP" else "🛑"
+    try:
+        await tg_application.bot.send_message(
+            chat_id=pos.user_id,
+            text=(
+                f"{icon} *{reason}* `{pos.symbol.split('/')[0]}` {pos.side} · {pos.exchange_name}\n"
+                f"Giá đóng: `{exit_price:.6g}` · PnL: `{trade['net_pnl']:+.2f} USDT`"
+            ),
+            parse_mode="Markdown",
+        )
+    except Exception as e:
+        logger.error(f"Position monitor: notify {pos.user_id} failed: {e}")
+
+async def check_positions(tg_application: Application):
+    """One pass over all open positions; returns the number of positions closed."""
+    by_exchange = defaultdict(list)
+    async for pos in database.iter_open_positions():
+        if pos.tp_price is not None and pos.sl_price is not None:
+            by_exchange[pos.exchange_name].append(pos)
+    if not by_exchange:
+        return 0
+
+    names = list(by_exchange)
+    snapshots = await asyncio.gather(*(_prices_for(name, by_exchange[name]) for name in names))
+
+    closes = []
+    for name, prices in zip(names, snapshots):
+        positions = by_exchange[name]
+        sides = np.fromiter((1.0 if p.side == "LONG" else -1.0 for p in positions), float, len(positions))
+        last = np.fromiter((prices.get(p.symbol, np.nan) for p in positions), float, len(positions))
+        tp = np.fromiter((p.tp_price for p in positions), float, len(positions))
+        sl = np.fromiter((p.sl_price for p in positions), float, len(positions))
+        hit_tp, hit_sl = triggered(sides, last, tp, sl)
+        for i in np.flatnonzero(hit_tp | hit_sl):
+            closes.append((positions[i], float(last[i]), "TP" if hit_tp[i] else "SL"))
+
+    semaphore = asyncio.Semaphore(config.POSITION_MONITOR_CONCURRENCY)
+
+    async def close_one(pos, price, reason):
+        async with semaphore:
+            try:
+                await _close(pos, price, reason, tg_application)
+            except Exception as e:
+                logger.error(f"Position monitor: closing {pos.symbol} for {pos.user_id} on {pos.exchange_name} failed: {e}")
+
+    await asyncio.gather(*(close_one(*c) for c in closes))
+    return len(closes)
+
+async def position_monitor_task(tg_application: Application):
+    """Background task: check every open position's TP/SL every POSITION_MONITOR_INTERVAL seconds."""
+    while True:
+        t0 = time.perf_counter()
+        try:
+            closed = await check_positions(tg_application)
+            if closed:
+                logger.info(f"Position monitor: {closed} position(s) hit TP/SL ({time.perf_counter() - t0:.2f}s).")
+        except Exception as e:
+            logger.error(f"Position monitor error: {e}")
+        await asyncio.sleep(max(0.0, config.POSITION_MONITOR_INTERVAL - (time.perf_counter() - t0)))
+
+async def close():
+    for client in _ticker_clients.values():
+        try:
+            await client.close_connection()
+        except Exception:
+            pass
+    _ticker_clients.clear()
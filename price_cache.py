@@ -0,0 +1,36 @@
+import time
+import config
+
+# ══════════════════════════════════════════════════════
+#  price_cache.py  —  Giá gần nhất của mỗi cặp (dùng chung toàn tiến trình)
+#  Được cập nhật từ nến scanner vừa tải và từ ticker (position
+#  monitor, fallback của process_signal). Chỉ dùng để tính khối
+#  lượng lệnh, nên giá của một sàn là đủ cho mọi sàn.
+# ══════════════════════════════════════════════════════
+
+# {symbol: (price, monotonic time it was observed)}
+_prices = {}
+
+def update(symbol, price):
+    if price:
+        _prices[symbol] = (float(price), time.monotonic())
+
+def update_many(prices):
+    """prices: {symbol: price}, e.g. the result of BaseExchange.get_tickers."""
+    now = time.monotonic()
+    for symbol, price in prices.items():
+        if price:
+            _prices[symbol] = (float(price), now)
+
+def get(symbol, max_age=None):
+    """Last price if it was observed less than max_age seconds ago (default PRICE_CACHE_MAX_AGE), else None."""
+    entry = _prices.get(symbol)
+    if entry is None:
+        return None
+    price, seen = entry
+    if time.monotonic() - seen > (config.PRICE_CACHE_MAX_AGE if max_age is None else max_age):
+        return None
+    return price
+
+def clear():
+    _prices.clear()
@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens refill per second up to `capacity`.
+    acquire(n) waits until n tokens are available; waiters are served in order.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+    def drain(self, seconds: float) -> None:
+        """Empty the bucket and pause refills (e.g. after the venue answered 429 with Retry-After)."""
+        self._tokens = -seconds * self.rate
+        self._updated = time.monotonic()
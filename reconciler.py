@@ -0,0 +1,166 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from telegram.ext import Application
+
+import config
+import database
+import execution_queue
+import price_cache
+from exchanges import get_exchange_instance
+
+logger = logging.getLogger(__name__)
+
+# ══════════════════════════════════════════════════════
+#  reconciler.py  —  Đối chiếu open_positions với sàn
+#  Mỗi (user, sàn) có vị thế trong DB: đúng MỘT lệnh fetch_positions
+#  cho mọi cặp. Vị thế còn trong DB nhưng sàn không còn (đóng tay,
+#  bị thanh lý, lệnh không khớp) được chuyển sang trade_history
+#  trong một transaction; vị thế trên sàn mà DB không biết chỉ
+#  được báo cáo.
+# ══════════════════════════════════════════════════════
+
+# Untracked exchange positions already reported: {(user_id, exchange, symbol, side)}, so users
+# trading by hand on the same account are told once, not every pass
+_reported_untracked = set()
+
+def _age_seconds(opened_at):
+    # opened_at is SQLite CURRENT_TIMESTAMP (UTC, 'YYYY-MM-DD HH:MM:SS')
+    try:
+        opened = datetime.strptime(str(opened_at), "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return float("inf")
+    return (datetime.now(timezone.utc) - opened).total_seconds()
+
+def diff_account(db_positions, exchange_positions):
+    """
+    Compare one account's DB rows with its live exchange positions.
+    Returns (stale DB rows, [(symbol, side) open on the exchange but unknown to the DB]).
+    Rows younger than RECONCILE_GRACE_SECONDS are never stale (the exchange may lag the fill).
+    """
+    live = {(p['symbol'], str(p.get('side') or '').upper()) for p in exchange_positions}
+    known = {(p.symbol, p.side) for p in db_positions}
+    stale = [p for p in db_positions
+             if (p.symbol, p.side) not in live and _age_seconds(p.opened_at) >= config.RECONCILE_GRACE_SECONDS]
+    untracked = sorted(live - known)
+    return stale, untracked
+
+async def _live_positions(user_id, exchange_name):
+    """Open positions on one account (one API call), or None if they can't be fetched."""
+    apis = await database.get_exchange_apis(user_id)
+    api = next((a for a in apis if a['exchange_name'] == exchange_name), None)
+    exchange = api and get_exchange_instance(api['exchange_name'], api['api_key'], api['api_secret'], api['passphrase'])
+    if not exchange:
+        return None
+    try:
+        return await execution_queue.submit(exchange_name, exchange.get_positions, weight=5)
+    except Exception as e:
+        logger.error(f"Reconcile: fetch_positions failed for user {user_id} on {exchange_name}: {e}")
+        return None
+    finally:
+        await exchange.close_connection()
+
+async def _cancel_protection(user_id, exchange_name, positions):
+    """Cancel the TP/SL orders left behind by positions closed on the exchange (adapters with protection_orders)."""
+    positions = [p for p in positions if p.client_order_id]
+    if not positions:
+        return
+    apis = await database.get_exchange_apis(user_id)
+    api = next((a for a in apis if a['exchange_name'] == exchange_name), None)
+    exchange = api and get_exchange_instance(api['exchange_name'], api['api_key'], api['api_secret'], api['passphrase'])
+    if not exchange:
+        return
+    try:
+        if not exchange.protection_orders:
+            return
+        for pos in positions:
+            try:
+                await execution_queue.submit(
+                    exchange_name, lambda: exchange.cancel_protection(pos.symbol, pos.client_order_id), weight=2
+                )
+            except Exception as e:
+                logger.error(f"Reconcile: cancelling TP/SL of {pos.symbol} for user {user_id} on {exchange_name} failed: {e}")
+    finally:
+        await exchange.close_connection()
+
+async def reconcile(tg_application: Application = None):
+    """One reconciliation pass over every account that has open positions in the DB."""
+    accounts = defaultdict(list)
+    async for pos in database.iter_open_positions():
+        accounts[(pos.user_id, pos.exchange_name)].append(pos)
+    if not accounts:
+        return {'accounts': 0, 'closed': 0, 'untracked': 0, 'failed': 0}
+
+    semaphore = asyncio.Semaphore(config.RECONCILE_CONCURRENCY)
+
+    async def fetch(key):
+        async with semaphore:
+            return await _live_positions(*key)
+
+    keys = list(accounts)
+    results = await asyncio.gather(*(fetch(key) for key in keys))
+
+    closes, untracked_by_user, failed, stale_by_account = [], defaultdict(list), 0, {}
+    for (user_id, exchange_name), live in zip(keys, results):
+        if live is None:
+            failed += 1
+            continue
+        stale, untracked = diff_account(accounts[(user_id, exchange_name)], live)
+        if stale:
+            stale_by_account[(user_id, exchange_name)] = stale
+        for pos in stale:
+            # Exit price unknown: best recent price, else the entry (PnL 0)
+            exit_price = price_cache.get(pos.symbol, max_age=config.RECONCILE_PRICE_MAX_AGE) or pos.entry_price
+            closes.append((user_id, pos.id, exit_price, 0.0, 'RECONCILED'))
+        for symbol, side in untracked:
+            untracked_by_user[user_id].append((exchange_name, symbol, side))
+
+    trades = await database.close_open_positions(closes) if closes else []
+
+    async def cancel(key):
+        async with semaphore:
+            await _cancel_protection(*key, stale_by_account[key])
+
+    await asyncio.gather(*(cancel(key) for key in stale_by_account))
+    n_untracked = sum(len(v) for v in untracked_by_user.values())
+    global _reported_untracked
+    current = {(user_id, *item) for user_id, items in untracked_by_user.items() for item in items}
+    new_untracked = defaultdict(list)
+    for user_id, *item in current - _reported_untracked:
+        new_untracked[user_id].append(tuple(item))
+    _reported_untracked = current
+    logger.info(
+        f"Reconcile: {len(keys)} account(s), {len(trades)} stale position(s) closed, "
+        f"{n_untracked} untracked on exchange, {failed} account(s) unreachable."
+    )
+    if tg_application is not None:
+        await _notify(tg_application, trades, new_untracked)
+    return {'accounts': len(keys), 'closed': len(trades), 'untracked': n_untracked, 'failed': failed}
+
+async def _notify(tg_application, trades, untracked_by_user):
+    by_user = defaultdict(list)
+    for trade in trades:
+        by_user[trade['user_id']].append(
+            f"🗑 `{trade['symbol'].split('/')[0]}` {trade['side']} · {trade['exchange_name']} — không còn trên sàn, đã gỡ khỏi danh sách"
+        )
+    for user_id, items in untracked_by_user.items():
+        for exchange_name, symbol, side in items:
+            by_user[user_id].append(f"❔ `{symbol.split('/')[0]}` {side} · {exchange_name} — đang mở trên sàn nhưng bot không theo dõi")
+    for user_id, lines in by_user.items():
+        try:
+            await tg_application.bot.send_message(
+                chat_id=user_id, text="🔄 *ĐỐI CHIẾU VỊ THẾ*\n" + "\n".join(lines), parse_mode="Markdown"
+            )
+        except Exception as e:
+            logger.error(f"Reconcile: notify {user_id} failed: {e}")
+
+async def reconciler_task(tg_application: Application):
+    """Background task: reconcile every RECONCILE_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(config.RECONCILE_INTERVAL)
+        try:
+            await reconcile(tg_application)
+        except Exception as e:
+            logger.error(f"Reconcile error: {e}")
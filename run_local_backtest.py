@@ -11,11 +11,31 @@ from datetime import datetime, timedelta
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import strategy
 import config
+from backtest_cache import BacktestCache, data_hash, make_key
 
-def fetch_historical_data(exchange, symbol, timeframe, days=90):
-    since = int((datetime.now() - timedelta(days=days)).timestamp() * 1000)
+# Tăng khi logic tín hiệu / mô phỏng thay đổi để vô hiệu hóa cache cũ
+ENGINE_VERSION = 1
+
+# Số nến tối đa sàn trả về cho một request fetch_ohlcv (Binance spot: 1000)
+FETCH_LIMIT = 1000
+
+TRADE_COLUMNS = ['type', 'entry_time', 'exit_time', 'entry', 'exit', 'exit_reason', 'pnl', 'win']
+
+def closed_range(timeframe, days):
+    """
+    [since, until) thẳng hàng với lưới nến, kết thúc ở nến đã đóng cuối cùng:
+    chạy lại trong cùng một nến cho cùng khoảng thời gian (và cùng key cache).
+    """
+    tf_ms = config.TIMEFRAME_MINUTES[timeframe] * 60_000
+    until = int(time.time() * 1000) // tf_ms * tf_ms
+    return until - days * 86_400_000 // tf_ms * tf_ms, until
+
+def fetch_historical_data(exchange, symbol, timeframe, days=90, since=None, until=None):
+    """Nến từ sàn; since / until (ms, until không tính) thay cho days nếu có — nến từ until trở đi bị bỏ."""
+    if since is None:
+        since = int((datetime.now() - timedelta(days=days)).timestamp() * 1000)
     all_ohlcv = []
-    print(f"Đang tải dữ liệu {days} ngày trước...")
+    print(f"Đang tải dữ liệu từ {datetime.fromtimestamp(since / 1000):%Y-%m-%d %H:%M}...")
     while True:
         ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=1000)
         if len(ohlcv) == 0:
@@ -26,37 +46,31 @@ def fetch_historical_data(exchange, symbol, timeframe, days=90):
             ohlcv = ohlcv[1:]
             
         all_ohlcv.extend(ohlcv)
-        if len(ohlcv) < 999:
+        if len(ohlcv) < 999 or (until is not None and ohlcv[-1][0] >= until):
             break
         since = ohlcv[-1][0] + 1
         time.sleep(0.1)
+    if until is not None:
+        all_ohlcv = [c for c in all_ohlcv if c[0] < until]
     return all_ohlcv
 
-def run_backtest(symbol='BTC/USDT', timeframe='15m', days=90):
-    print(f"Bắt đầu tải dữ liệu {symbol} khung {timeframe} từ Binance...")
-    exchange = ccxt.binance()
-    
-    # Fetch data
-    ohlcv = fetch_historical_data(exchange, symbol, timeframe, days)
-    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    
-    # Tính toán tín hiệu dựa trên strategy.py
-    print("Đang tính toán tín hiệu...")
-    
-    if len(df) < config.ATR_PERIOD:
-        print("Không đủ dữ liệu")
-        return
-        
+def add_signal_columns(df, trend_length=None, atr_period=None, sma_period=None):
+    """
+    Tính tín hiệu LONG/SHORT (cạnh lên của diamond) cho toàn bộ chuỗi nến.
+    Tham số None = lấy mặc định trong config.
+    """
+    trend_length = trend_length or config.TREND_LENGTH
+    atr_period = atr_period or config.ATR_PERIOD
+    sma_period = sma_period or config.SMA_PERIOD
     df['high'] = df['high'].astype(float)
     df['low'] = df['low'].astype(float)
     df['close'] = df['close'].astype(float)
     df['hl2'] = (df['high'] + df['low']) / 2
     
-    atr_series = strategy.calculate_atr(df, config.ATR_PERIOD)
-    atr = atr_series.rolling(window=config.TREND_LENGTH).max()
+    atr_series = strategy.calculate_atr(df, atr_period)
+    atr = atr_series.rolling(window=trend_length).max()
     
-    sma = strategy.calculate_sma(df['close'], config.TREND_LENGTH)
+    sma = strategy.calculate_sma(df['close'], trend_length)
     upper = sma + atr
     lower = sma - atr
     
@@ -78,7 +92,7 @@ def run_backtest(symbol='BTC/USDT', timeframe='15m', days=90):
     df['origin_price_dn'] = np.where(trend_changed_dn, df['hl2'], np.nan)
     df['origin_price_dn'] = df['origin_price_dn'].ffill()
     
-    sma_20 = strategy.calculate_sma(df['hl2'], config.SMA_PERIOD)
+    sma_20 = strategy.calculate_sma(df['hl2'], sma_period)
     
     # Diamond visibility (from color_lines in indicator)
     # Green diamond visible when: origin_hl2 < sma(hl2, 20) = channel slopes UP
@@ -92,47 +106,253 @@ def run_backtest(symbol='BTC/USDT', timeframe='15m', days=90):
     
     df['LONG'] = long_signal
     df['SHORT'] = short_signal
+    return df
+
+def signal_params(trend_length=None, atr_period=None, sma_period=None):
+    """Tham số chỉ báo đã điền mặc định từ config (dùng làm một phần của cache key)."""
+    return {
+        'trend_length': trend_length or config.TREND_LENGTH,
+        'atr_period': atr_period or config.ATR_PERIOD,
+        'sma_period': sma_period or config.SMA_PERIOD,
+    }
+
+def cached_signal_columns(df, cache=None, digest=None, **params):
+    """add_signal_columns, nhưng đọc/ghi cột LONG/SHORT qua BacktestCache nếu có."""
+    params = signal_params(**params)
+    if cache is None:
+        return add_signal_columns(df, **params)
+    digest = digest or data_hash(df)
+    key = make_key('signals', digest, engine=ENGINE_VERSION, **params)
+    signals = cache.get(key)
+    if signals is not None:
+        df['LONG'] = signals[0]
+        df['SHORT'] = signals[1]
+        return df
+    add_signal_columns(df, **params)
+    cache.put(key, np.vstack([df['LONG'].to_numpy(dtype=bool), df['SHORT'].to_numpy(dtype=bool)]))
+    return df
+
+class LowerTimeframeFills:
+    """
+    Xác định TP hay SL chạm trước trong một nến khung lớn bằng nến 1m.
+    Nến 1m chỉ được tải (lazy) cho những nến mơ hồ — chạm cả TP lẫn SL.
+    """
+    def __init__(self, exchange, symbol, timeframe='1m', store=None):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.store = store
+        self._cache = {}  # bar_open_ms -> ohlcv list
+        self.fetches = 0
+
+    def _load(self, bar_open_ms, bar_minutes):
+        if bar_open_ms not in self._cache:
+            step = config.TIMEFRAME_MINUTES[self.timeframe]
+            limit = max(1, bar_minutes // step)
+            end_ms = bar_open_ms + bar_minutes * 60_000
+            ohlcv = self.store.load(self.symbol, self.timeframe, bar_open_ms, end_ms) if self.store else []
+            # Kho nến cục bộ thiếu dữ liệu -> tải từ sàn, chia trang vì mỗi request
+            # chỉ trả tối đa FETCH_LIMIT nến (nến 1d = 1440 nến 1m)
+            if len(ohlcv) < limit:
+                ohlcv, since = [], bar_open_ms
+                while since < end_ms:
+                    page = self.exchange.fetch_ohlcv(self.symbol, self.timeframe, since=since,
+                                                     limit=min(FETCH_LIMIT, limit - len(ohlcv)))
+                    self.fetches += 1
+                    if not page:
+                        break
+                    ohlcv.extend(c for c in page if c[0] >= since)
+                    since = page[-1][0] + step * 60_000
+                    if len(ohlcv) >= limit:
+                        break
+            self._cache[bar_open_ms] = [c for c in ohlcv if bar_open_ms <= c[0] < end_ms]
+        return self._cache[bar_open_ms]
+
+    def first_hit(self, bar_open_ms, bar_minutes, side, tp_price, sl_price):
+        """Trả về 'TP', 'SL' hoặc None nếu nến 1m vẫn không phân định được."""
+        for c in self._load(bar_open_ms, bar_minutes):
+            high, low = float(c[2]), float(c[3])
+            if side == 1:
+                hit_tp, hit_sl = high >= tp_price, low <= sl_price
+            else:
+                hit_tp, hit_sl = low <= tp_price, high >= sl_price
+            if hit_tp and hit_sl:
+                return None
+            if hit_sl:
+                return 'SL'
+            if hit_tp:
+                return 'TP'
+        return None
+
+def _fill_price(price, side, slippage):
+    """Giá khớp lệnh market sau trượt giá: mua cao hơn, bán thấp hơn."""
+    return price * (1 + slippage) if side == 1 else price * (1 - slippage)
+
+def simulate_trades(df, timeframe, order_size=1000.0, fee_rate=0.0004, tp_percent=None, sl_percent=None,
+                    slippage=0.0, next_bar_entry=False, fill_resolver=None):
+    """
+    Mô phỏng lệnh trên df đã có cột LONG/SHORT.
+    - tp_percent / sl_percent: None = chỉ đóng lệnh khi có tín hiệu ngược chiều (hành vi cũ).
+    - next_bar_entry: vào/thoát lệnh theo tín hiệu tại giá open nến kế tiếp thay vì close nến tín hiệu.
+    - slippage: tỉ lệ trượt giá cho mọi lệnh market (vào lệnh, thoát theo tín hiệu, SL).
+    - fill_resolver: LowerTimeframeFills để xử lý nến chạm cả TP và SL; None = giả định SL trước.
+    """
+    bar_minutes = config.TIMEFRAME_MINUTES[timeframe]
+    ts = df['timestamp'].to_numpy()
+    opens = df['open'].astype(float).to_numpy()
+    highs = df['high'].to_numpy()
+    lows = df['low'].to_numpy()
+    closes = df['close'].to_numpy()
+    longs = df['LONG'].to_numpy(dtype=bool)
+    shorts = df['SHORT'].to_numpy(dtype=bool)
+    n = len(df)
     
-    # Backtest logic
     position = 0 # 1 for Long, -1 for Short
     entry_price = 0.0
+    entry_time = None
+    tp_price = sl_price = None
+    pending = 0 # tín hiệu chờ khớp ở open nến sau (next_bar_entry)
     trades = []
+    ambiguous = 0
     
-    initial_capital = 10000.0
-    capital = initial_capital
-    order_size = 1000.0 # Trade $1000 mỗi lệnh theo yêu cầu
-    fee_rate = 0.0004 # 0.04% taker fee Binance Futures
+    def close_trade(i, exit_price, reason):
+        nonlocal position
+        if position == 1:
+            pnl = (exit_price - entry_price) / entry_price * order_size
+        else:
+            pnl = (entry_price - exit_price) / entry_price * order_size
+        fee = (entry_price + exit_price) * (order_size / entry_price) * fee_rate
+        net_pnl = pnl - fee
+        trades.append({'type': 'LONG' if position == 1 else 'SHORT', 'entry_time': entry_time, 'exit_time': ts[i],
+                       'entry': entry_price, 'exit': exit_price, 'exit_reason': reason,
+                       'pnl': net_pnl, 'win': net_pnl > 0})
+        position = 0
+    
+    def open_trade(i, side, price):
+        nonlocal position, entry_price, entry_time, tp_price, sl_price
+        position = side
+        entry_price = _fill_price(price, side, slippage)
+        entry_time = ts[i]
+        tp_price = entry_price * (1 + side * tp_percent / 100) if tp_percent else None
+        sl_price = entry_price * (1 - side * sl_percent / 100) if sl_percent else None
     
-    for i in range(len(df)):
-        current_price = df['close'].iloc[i]
+    for i in range(n):
+        # Khớp tín hiệu của nến trước tại giá open nến này
+        if pending:
+            if position == -pending:
+                close_trade(i, _fill_price(opens[i], pending, slippage), 'SIGNAL')
+            if position == 0:
+                open_trade(i, pending, opens[i])
+            pending = 0
+        
+        # Kiểm tra TP/SL trong nến (lệnh vào theo close chỉ được kiểm tra từ nến sau)
+        if position != 0 and (tp_price or sl_price):
+            if position == 1:
+                hit_tp = tp_price is not None and highs[i] >= tp_price
+                hit_sl = sl_price is not None and lows[i] <= sl_price
+            else:
+                hit_tp = tp_price is not None and lows[i] <= tp_price
+                hit_sl = sl_price is not None and highs[i] >= sl_price
+            if hit_tp and hit_sl:
+                ambiguous += 1
+                first = None
+                if fill_resolver is not None:
+                    first = fill_resolver.first_hit(int(pd.Timestamp(ts[i]).value // 1_000_000), bar_minutes,
+                                                    position, tp_price, sl_price)
+                # Không phân định được -> giả định SL trước (bảo thủ)
+                hit_tp = first == 'TP'
+                hit_sl = not hit_tp
+            if hit_sl:
+                close_trade(i, _fill_price(sl_price, -position, slippage), 'SL')
+            elif hit_tp:
+                close_trade(i, tp_price, 'TP')
+        
+        signal = 1 if longs[i] else (-1 if shorts[i] else 0)
+        if not signal:
+            continue
+        if next_bar_entry:
+            if i + 1 < n:
+                pending = signal
+            continue
         
         # Nếu có vị thế và có tín hiệu ngược lại, đóng vị thế
-        if position == 1 and df['SHORT'].iloc[i]:
-            # Đóng Long
-            pnl = (current_price - entry_price) / entry_price * order_size
-            fee = (entry_price + current_price) * (order_size / entry_price) * fee_rate
-            net_pnl = pnl - fee
-            capital += net_pnl
-            trades.append({'type': 'LONG', 'entry': entry_price, 'exit': current_price, 'pnl': net_pnl, 'win': net_pnl > 0})
-            position = 0
-            
-        elif position == -1 and df['LONG'].iloc[i]:
-            # Đóng Short
-            pnl = (entry_price - current_price) / entry_price * order_size
-            fee = (entry_price + current_price) * (order_size / entry_price) * fee_rate
-            net_pnl = pnl - fee
-            capital += net_pnl
-            trades.append({'type': 'SHORT', 'entry': entry_price, 'exit': current_price, 'pnl': net_pnl, 'win': net_pnl > 0})
-            position = 0
-            
+        if position == -signal:
+            close_trade(i, _fill_price(closes[i], signal, slippage), 'SIGNAL')
         # Mở vị thế mới nếu chưa có
         if position == 0:
-            if df['LONG'].iloc[i]:
-                position = 1
-                entry_price = current_price
-            elif df['SHORT'].iloc[i]:
-                position = -1
-                entry_price = current_price
+            open_trade(i, signal, closes[i])
+    
+    return trades, ambiguous
+
+def run_backtest(symbol='BTC/USDT', timeframe='15m', days=90, tp_percent=None, sl_percent=None,
+                 slippage=0.0, next_bar_entry=False, resolve_fills=False, store=None, use_cache=True):
+    """
+    store: CandleStore — đọc nến từ kho cục bộ (candle_downloader.py) thay vì tải từ Binance.
+    use_cache: dùng BacktestCache; chạy lại với cùng dữ liệu nến + tham số trả kết quả ngay.
+    """
+    exchange = ccxt.binance()
+    
+    # Backtest logic
+    initial_capital = 10000.0
+    order_size = 1000.0 # Trade $1000 mỗi lệnh theo yêu cầu
+    fee_rate = 0.0004 # 0.04% taker fee Binance Futures
+    resolve_fills = bool(resolve_fills and timeframe != '1m' and (tp_percent or sl_percent))
+    
+    # Chỉ nến đã đóng trong khoảng thẳng hàng với lưới nến (nến đang chạy đổi mỗi lần chạy)
+    since, until = closed_range(timeframe, days)
+    ohlcv = []
+    if store is not None:
+        print(f"Đọc dữ liệu {symbol} khung {timeframe} từ kho nến cục bộ...")
+        ohlcv = store.load(symbol, timeframe, since, until)
+    
+    cache = BacktestCache() if use_cache else None
+    trade_params = dict(engine=ENGINE_VERSION, timeframe=timeframe, order_size=order_size, fee_rate=fee_rate,
+                        tp_percent=tp_percent, sl_percent=sl_percent, slippage=slippage,
+                        next_bar_entry=next_bar_entry, resolve_fills=resolve_fills, **signal_params())
+    # Nến từ sàn: key theo (cặp, khung, khoảng thời gian) nên được kiểm tra TRƯỚC khi tải.
+    # Nến từ kho cục bộ (đọc nhanh, có thể được bổ sung sau): key theo hash dữ liệu.
+    source = None if ohlcv else f"binance|{symbol}|{timeframe}|{since}|{until}"
+    if cache and source:
+        cached = cache.get(make_key('trades', source, **trade_params))
+        if cached is not None:
+            print("Dùng kết quả backtest đã cache (cùng khoảng nến và tham số).")
+            return _report_backtest(symbol, timeframe, days, cached, initial_capital, order_size,
+                                    tp_percent, sl_percent, slippage, next_bar_entry, resolve_fills)
+    if not ohlcv:
+        print(f"Bắt đầu tải dữ liệu {symbol} khung {timeframe} từ Binance...")
+        ohlcv = fetch_historical_data(exchange, symbol, timeframe, since=since, until=until)
+    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    
+    if len(df) < config.ATR_PERIOD:
+        print("Không đủ dữ liệu")
+        return None
+    
+    fill_resolver = LowerTimeframeFills(exchange, symbol, store=store) if resolve_fills else None
+    
+    digest = data_hash(df) if cache else None
+    trades_key = make_key('trades', source or digest, **trade_params) if cache else None
+    cached = cache.get(trades_key) if cache else None
+    
+    if cached is not None:
+        print("Dùng kết quả backtest đã cache (dữ liệu và tham số không đổi).")
+    else:
+        # Tính toán tín hiệu dựa trên strategy.py
+        print("Đang tính toán tín hiệu...")
+        cached_signal_columns(df, cache, digest)
+        trades, ambiguous = simulate_trades(df, timeframe, order_size, fee_rate, tp_percent, sl_percent,
+                                            slippage, next_bar_entry, fill_resolver)
+        cached = {'trades': trades, 'ambiguous': ambiguous, 'bars': len(df),
+                  'fetches': fill_resolver.fetches if fill_resolver else 0}
+        if cache:
+            cache.put(trades_key, cached)
+    return _report_backtest(symbol, timeframe, days, cached, initial_capital, order_size,
+                            tp_percent, sl_percent, slippage, next_bar_entry, resolve_fills)
+
+def _report_backtest(symbol, timeframe, days, result, initial_capital, order_size,
+                     tp_percent, sl_percent, slippage, next_bar_entry, resolve_fills):
+    trades, ambiguous, fetches = result['trades'], result['ambiguous'], result['fetches']
+    capital = initial_capital + sum(t['pnl'] for t in trades)
                 
     wins = [t for t in trades if t['win']]
     losses = [t for t in trades if not t['win']]
@@ -141,8 +361,13 @@ def run_backtest(symbol='BTC/USDT', timeframe='15m', days=90):
     total_pnl = sum(t['pnl'] for t in trades)
     
     print("-" * 50)
-    print(f"KẾT QUẢ BACKTEST: {symbol} | Khung: {timeframe} | {len(df)} nến ({days} ngày)")
+    print(f"KẾT QUẢ BACKTEST: {symbol} | Khung: {timeframe} | {result.get('bars', '?')} nến ({days} ngày)")
     print(f"Volume mỗi lệnh: ${order_size:.2f}")
+    if tp_percent or sl_percent:
+        print(f"TP/SL: {tp_percent}% / {sl_percent}% | Nến chạm cả TP và SL: {ambiguous}"
+              + (f" (đã tải 1m cho {fetches} nến)" if resolve_fills else " (giả định SL trước)"))
+    if next_bar_entry or slippage:
+        print(f"Khớp lệnh: {'open nến kế tiếp' if next_bar_entry else 'close nến tín hiệu'} | Trượt giá: {slippage * 100:.3f}%")
     print(f"Tổng số lệnh: {len(trades)}")
     print(f"Lệnh thắng: {len(wins)}")
     print(f"Lệnh thua: {len(losses)}")
@@ -150,7 +375,12 @@ def run_backtest(symbol='BTC/USDT', timeframe='15m', days=90):
     print(f"Tổng PNL Net (sau phí): ${total_pnl:.2f}")
     print(f"Vốn cuối cùng: ${capital:.2f} (Vốn ban đầu: ${initial_capital:.2f})")
     print("-" * 50)
+    
+    return pd.DataFrame(trades, columns=TRADE_COLUMNS)
 
 if __name__ == "__main__":
     run_backtest(symbol='BTC/USDT', timeframe='15m', days=90)
     run_backtest(symbol='ETH/USDT', timeframe='15m', days=90)
+    # Khung lớn có TP/SL: nến chạm cả TP và SL được phân định bằng nến 1m
+    run_backtest(symbol='BTC/USDT', timeframe='4h', days=90, tp_percent=2.0, sl_percent=1.0,
+                 slippage=0.0005, next_bar_entry=True, resolve_fills=True)
@@ -5,6 +5,9 @@ import pandas as pd
 
 import config
 import database
+import execution_queue
+import price_cache
+import signal_log
 from strategy import calculate_signal
 from exchanges import get_exchange_instance
 from trade_manager import process_signal
@@ -24,10 +27,13 @@ async def scan_pair(user_id, symbol, timeframe, is_auto_trade, tg_application: A
          
          limit = max(config.ATR_PERIOD + config.TREND_LENGTH, 300)
          
-         klines = await anonymous_binance.get_klines(symbol, timeframe, limit=limit)
+         klines = await execution_queue.submit(
+             "Binance", lambda: anonymous_binance.get_klines(symbol, timeframe, limit=limit), weight=2
+         )
          
          if not klines or len(klines) < config.ATR_PERIOD:
              return
+         price_cache.update(symbol, klines[-1][4])
              
          df = pd.DataFrame(klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])  # type: ignore[arg-type]
          
@@ -39,6 +45,7 @@ async def scan_pair(user_id, symbol, timeframe, is_auto_trade, tg_application: A
          if signal != 'HOLD' and signal != last_signal:
              # NEW SIGNAL!
              last_signals[cache_key] = signal
+             signal_log.record(user_id, symbol, timeframe, signal, klines[-1][0], klines[-1][4])
              
              DIVIDER = "━" * 28
              if signal == "LONG":
@@ -61,7 +68,7 @@ async def scan_pair(user_id, symbol, timeframe, is_auto_trade, tg_application: A
                  message += "⚙️ _Bot đang tự động mở lệnh..._"
                  await tg_application.bot.send_message(chat_id=user_id, text=message, parse_mode="Markdown")
                  # Trigger auto trade
-                 await process_signal(user_id, symbol, signal, user_exchanges)
+                 await process_signal(user_id, symbol, signal, user_exchanges, bar_ts=klines[-1][0], timeframe=timeframe)
              else:
                  message += "📌 _Auto‑trade TẮT · Hãy tự vào lệnh!_"
                  await tg_application.bot.send_message(chat_id=user_id, text=message, parse_mode="Markdown")
@@ -75,52 +82,52 @@ async def scan_pair(user_id, symbol, timeframe, is_auto_trade, tg_application: A
              except Exception:
                  pass
 
+async def scan_user(entry, tg_application: Application):
+    """Scan every pair of one user (one ScanEntry); requests are paced by execution_queue"""
+    user_id = entry.user_id
+    is_auto_trade = entry.auto_trade
+    
+    # get their exchanges only once if auto trade is on
+    user_exchanges = []
+    if is_auto_trade:
+         for api in entry.apis:
+              ex = get_exchange_instance(api.exchange_name, api.api_key, api.api_secret, api.passphrase)
+              if ex: user_exchanges.append((str(api.exchange_name), ex))
+    
+    try:
+         for symbol, timeframe in entry.pairs:
+              await scan_pair(user_id, symbol, timeframe, is_auto_trade, tg_application, user_exchanges)
+    finally:
+         for _, ex in user_exchanges:
+             try:
+                 await ex.close_connection()
+             except Exception:
+                 pass
+
 async def scanner_task(tg_application: Application):
     """Background task that runs periodically to fetch data and look for signals"""
     
     while True:
         try:
-             # Get all watched pairs
-             pairs = await database.get_all_watched_pairs()
-             
-             if pairs:
-                  # Group by user_id to optimize exchange instance creation
-                  user_pairs = {}
-                  for row in pairs:
-                       uid = row['user_id']
-                       if uid not in user_pairs:
-                            user_pairs[uid] = []
-                       user_pairs[uid].append(row)
-                       
-                  for user_id, user_watched_list in user_pairs.items():
-                       # check if auto trade is enabled
-                       trading_config = await database.get_trading_config(user_id)
-                       if not trading_config: continue
-                       
-                       is_auto_trade = trading_config['auto_trade_enabled']
-                       
-                       # get their exchanges only once if auto trade is on
-                       user_exchanges = []
-                       if is_auto_trade:
-                            apis = await database.get_exchange_apis(user_id)
-                            for api in apis:
-                                 if api['is_enabled']:
-                                       ex = get_exchange_instance(api['exchange_name'], api['api_key'], api['api_secret'], api['passphrase'])
-                                       if ex: user_exchanges.append((str(api['exchange_name']), ex))
-                       
-                       try:
-                            for w_pair in user_watched_list:
-                                 symbol = w_pair['symbol']
-                                 timeframe = w_pair['timeframe']
-                                 
-                                 await scan_pair(user_id, symbol, timeframe, is_auto_trade, tg_application, user_exchanges)
-                                 await asyncio.sleep(0.5) # rate limiting
-                       finally:
-                            for _, ex in user_exchanges:
-                                try:
-                                    await ex.close_connection()
-                                except Exception:
-                                    pass
+             # Streamed one user at a time (paged reads); up to SCANNER_CONCURRENCY users in flight
+             semaphore = asyncio.Semaphore(config.SCANNER_CONCURRENCY)
+             tasks = set()
+
+             async def run(entry):
+                  try:
+                       await scan_user(entry, tg_application)
+                  except Exception as e:
+                       logger.error(f"Error scanning user {entry.user_id}: {e}")
+                  finally:
+                       semaphore.release()
+
+             async for entry in database.iter_scan_plan():
+                  await semaphore.acquire()
+                  task = asyncio.create_task(run(entry))
+                  tasks.add(task)
+                  task.add_done_callback(tasks.discard)
+             if tasks:
+                  await asyncio.gather(*tasks)
                             
         except Exception as e:
              logger.error(f"Scanner task global error: {e}")
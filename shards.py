@@ -0,0 +1,53 @@
+import os
+import zlib
+import config
+
+# ══════════════════════════════════════════════════════
+#  shards.py  —  Phân mảnh SQLite theo user
+#  Bảng theo user (config, API, cặp, vị thế, lịch sử lệnh...) được
+#  chia vào DB_SHARDS file theo hash(user_id); file DB_PATH là DB
+#  global (users, signal_events). DB_SHARDS = 1: mọi thứ nằm trong
+#  DB_PATH như trước.
+# ══════════════════════════════════════════════════════
+
+# Tables whose rows belong to exactly one user and live in that user's shard
+PER_USER_TABLES = [
+    'exchange_apis',
+    'trading_config',
+    'user_timeframes',
+    'user_symbols',
+    'watched_pairs',
+    'open_positions',
+    'trade_history',
+    'pnl_aggregates',
+]
+
+def is_sharded():
+    return config.DB_SHARDS > 1
+
+def global_path():
+    return config.DB_PATH
+
+def shard_index(user_id):
+    """Stable shard number for a user (crc32, so it never changes across processes)."""
+    return zlib.crc32(str(int(user_id)).encode()) % config.DB_SHARDS
+
+def _path_for_index(index):
+    if not is_sharded():
+        return config.DB_PATH
+    base, ext = os.path.splitext(config.DB_PATH)
+    return f"{base}.shard{index}{ext}"
+
+def shard_path(user_id):
+    return _path_for_index(shard_index(user_id))
+
+def all_shard_paths():
+    return [_path_for_index(i) for i in range(config.DB_SHARDS)]
+
+def all_paths():
+    """Global database first, then every shard (deduplicated when unsharded)."""
+    paths = [global_path()]
+    for path in all_shard_paths():
+        if path not in paths:
+            paths.append(path)
+    return paths
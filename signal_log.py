@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import time
+
+import config
+import database
+
+logger = logging.getLogger(__name__)
+
+# Signals waiting to be written: (user_id, symbol, timeframe, side, bar_ts, emitted_at, price)
+_buffer = []
+_flush_requested = asyncio.Event()
+
+def record(user_id, symbol, timeframe, side, bar_ts, price):
+    """Queue a signal event; never touches the database on the caller's path."""
+    _buffer.append((user_id, symbol, timeframe, side, int(bar_ts), int(time.time() * 1000), float(price)))
+    if len(_buffer) >= config.SIGNAL_LOG_MAX_BUFFER:
+        _flush_requested.set()
+
+async def flush():
+    """Write everything buffered so far in one transaction."""
+    global _buffer
+    if not _buffer:
+        return 0
+    events, _buffer = _buffer, []
+    try:
+        await database.insert_signal_events(events)
+    except Exception as e:
+        # Put them back so the next flush retries (bounded to avoid unbounded growth)
+        _buffer = (events + _buffer)[-config.SIGNAL_LOG_MAX_BUFFER * 10:]
+        logger.error(f"Signal log flush error: {e}")
+        return 0
+    return len(events)
+
+async def purge_expired():
+    """Apply retention: delete events older than SIGNAL_RETENTION_DAYS in small batches."""
+    cutoff = int((time.time() - config.SIGNAL_RETENTION_DAYS * 86400) * 1000)
+    total = 0
+    while True:
+        deleted = await database.purge_signal_events(cutoff)
+        total += deleted
+        if deleted == 0:
+            break
+        # Let other writers in between batches
+        await asyncio.sleep(0)
+    if total:
+        logger.info(f"Signal log retention: deleted {total} event(s).")
+    return total
+
+async def signal_log_task():
+    """Background task: flush the buffer periodically (or when full) and apply retention."""
+    last_purge = 0.0
+    while True:
+        try:
+            await asyncio.wait_for(_flush_requested.wait(), timeout=config.SIGNAL_LOG_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _flush_requested.clear()
+        await flush()
+        if time.monotonic() - last_purge >= config.SIGNAL_PURGE_INTERVAL:
+            last_purge = time.monotonic()
+            try:
+                await purge_expired()
+            except Exception as e:
+                logger.error(f"Signal log retention error: {e}")
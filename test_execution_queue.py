@@ -0,0 +1,73 @@
+"""
+test_execution_queue.py — Kiểm tra hàng đợi gọi API (execution_queue.py), không cần mạng.
+Chạy: python -m pytest -q test_execution_queue.py
+"""
+import asyncio
+
+import ccxt.async_support as ccxt
+import pytest
+
+import config
+import execution_queue
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(config, 'EXECUTION_BACKOFF_SECONDS', 0.3)
+    monkeypatch.setattr(config, 'EXECUTION_LIMITS', {'Test': (100, 100)})
+
+
+async def _noop():
+    pass
+
+
+async def _rate_limited():
+    raise ccxt.RateLimitExceeded('429')
+
+
+async def _hit_429():
+    # Warm up first: idle workers then hold a token while they wait for a job
+    await execution_queue.submit('Test', _noop)
+    await asyncio.sleep(0.01)
+    with pytest.raises(ccxt.RateLimitExceeded):
+        await execution_queue.submit('Test', _rate_limited)
+
+
+def test_cancelled_during_backoff_never_runs():
+    sent = []
+
+    async def place_order():
+        sent.append('order')
+
+    async def scenario():
+        try:
+            await _hit_429()
+            # Picked up by an idle worker, which is now waiting out the 429 pause
+            job = asyncio.create_task(execution_queue.submit('Test', place_order, priority=execution_queue.ORDER))
+            await asyncio.sleep(0.05)
+            job.cancel()
+            await asyncio.sleep(0.5)
+        finally:
+            await execution_queue.close()
+
+    asyncio.run(scenario())
+    assert sent == []
+
+
+def test_calls_wait_for_backoff():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        times = []
+
+        async def call():
+            times.append(loop.time() - start)
+
+        try:
+            await _hit_429()
+            start = loop.time()
+            await asyncio.gather(*(execution_queue.submit('Test', call) for _ in range(config.EXECUTION_WORKERS + 2)))
+        finally:
+            await execution_queue.close()
+        return times
+
+    assert min(asyncio.run(scenario())) >= 0.25
@@ -394,16 +394,21 @@ async def run_tests(dry_run: bool = False):
                 record("Open positions CRUD", False, "Không tìm thấy position")
             
             # Cleanup test database
+            await database.close_db()
             config.DB_PATH = original_db
             test_db_path = os.path.join(config.BASE_DIR, 'test_database.sqlite')
             if os.path.exists(test_db_path):
                 os.remove(test_db_path)
+                for suffix in ('-wal', '-shm'):
+                    if os.path.exists(test_db_path + suffix):
+                        os.remove(test_db_path + suffix)
                 print(f"  {C.DIM}🗑  Đã xóa test database{C.RESET}")
                 
         except Exception as e:
             record("Database operations", False, str(e))
             traceback.print_exc()
             # Restore original DB path
+            await database.close_db()
             config.DB_PATH = os.path.join(config.BASE_DIR, 'bot_database.sqlite')
 
         # ─────────────────────────────────────────────────────────
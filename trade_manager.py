@@ -1,12 +1,39 @@
+import asyncio
+import hashlib
 import logging
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+import config
 import database
+import execution_queue
+import market_cache
+import price_cache
 
 logger = logging.getLogger(__name__)
 
-async def process_signal(user_id, symbol, signal, user_exchanges):
+# Signal-to-fill latency (seconds) of recent orders, per exchange
+fill_latency = defaultdict(lambda: deque(maxlen=config.LATENCY_SAMPLES))
+
+def client_order_id(user_id, ex_name, symbol, timeframe, bar_ts, signal):
+    """
+    Deterministic client order id for one signal bar: the same signal always maps to
+    the same id, so a retried or repeated submission can't open a second position.
+    32 alphanumeric chars fits every supported exchange (OKX allows at most 32).
+    """
+    key = f"{user_id}|{ex_name}|{symbol}|{timeframe}|{bar_ts}|{signal}"
+    return "sb" + hashlib.sha1(key.encode()).hexdigest()[:30]
+
+async def process_signal(user_id, symbol, signal, user_exchanges, bar_ts=None, timeframe=None):
     """
     Process a new signal (LONG/SHORT) for a user.
-    Executes trades on all enabled exchanges and sets up TP/SL tracking in DB.
+    bar_ts / timeframe identify the signal bar; when given, orders carry a
+    deterministic client order id and are retried safely.
+    Executes trades on all enabled exchanges concurrently (bounded by
+    ORDER_FANOUT_TIMEOUT) and sets up TP/SL tracking in DB.
+    The caller owns the exchange connections.
     """
     if not user_exchanges:
         return
@@ -21,43 +48,117 @@ async def process_signal(user_id, symbol, signal, user_exchanges):
     tp_percent = trading_config['tp_percent']
     sl_percent = trading_config['sl_percent']
     
+    started = time.monotonic()
+    tasks = {}
     for ex_name, exchange in user_exchanges:
-        try:
-             # Calculate position size based on current price
-             # For simplicity we fetch current ticker or just use the margin_qty as order size depending on exchange
-             # Usually in CCXT, quantity is in base currency (e.g., BTC for BTC/USDT)
-             # So we need to convert USDT margin_qty -> base_ccy qty using current price
-             
-             # Fetch a quick kline to get latest close price
-             klines = await exchange.get_klines(symbol, "1m", limit=1)
-             if not klines: continue
-             current_price = float(klines[0][4])
-             
-             # Example quantity calculation: (margin_qty * leverage) / current_price
-             # BingX might behave differently, but CCXT handles standardization mostly
-             quantity = (margin_qty * leverage) / current_price
-             
-             # IMPORTANT format adjustment based on exchange min quantities might be required here
-             # For demo purposes, we will assume quantity is ok
-             
-             order = await exchange.open_position(symbol, signal, quantity, leverage, margin_mode)
-             if order:
-                  # Estimate entry price (or use actual if order returned it)
-                  entry_price = float(order.get('average', order.get('price', current_price)))
-                  order_id = order.get('id', 'unknown')
-                  
-                  # Calculate TP / SL Prices
-                  if signal == 'LONG':
-                       tp_price = entry_price * (1 + (tp_percent / 100))
-                       sl_price = entry_price * (1 - (sl_percent / 100))
-                  else:
-                       tp_price = entry_price * (1 - (tp_percent / 100))
-                       sl_price = entry_price * (1 + (sl_percent / 100))
-                       
-                  await database.add_open_position(user_id, ex_name, symbol, signal, entry_price, quantity, tp_price, sl_price, order_id)
-                  logger.info(f"User {user_id} Auto-traded {symbol} {signal} on {ex_name}")
-                  
-             await exchange.close_connection()
-                  
-        except Exception as e:
-             logger.error(f"Error executing auto-trade on {ex_name} for user {user_id}: {e}")
+        state = {'ordering': False}
+        task = asyncio.create_task(_trade_on(
+            user_id, ex_name, exchange, symbol, signal,
+            leverage, margin_qty, margin_mode, tp_percent, sl_percent, started, state,
+            client_order_id(user_id, ex_name, symbol, timeframe, bar_ts, signal) if bar_ts is not None else None
+        ))
+        tasks[task] = (ex_name, state)
+
+    _, pending = await asyncio.wait(tasks, timeout=config.ORDER_FANOUT_TIMEOUT)
+    in_flight = []
+    for task in pending:
+        ex_name, state = tasks[task]
+        if state['ordering']:
+            # The order may already have reached the exchange: let it finish so it gets recorded
+            logger.warning(f"Auto-trade on {ex_name} for user {user_id} past {config.ORDER_FANOUT_TIMEOUT}s deadline, order in flight")
+            in_flight.append(task)
+        else:
+            task.cancel()
+            logger.warning(f"Auto-trade on {ex_name} for user {user_id} cancelled: no order sent within {config.ORDER_FANOUT_TIMEOUT}s")
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+async def _trade_on(user_id, ex_name, exchange, symbol, signal,
+                    leverage, margin_qty, margin_mode, tp_percent, sl_percent, started, state, order_client_id=None):
+    """Execute one signal on one exchange. Errors are logged here so other exchanges are unaffected."""
+    try:
+         # Calculate position size based on current price
+         # For simplicity we fetch current ticker or just use the margin_qty as order size depending on exchange
+         # Usually in CCXT, quantity is in base currency (e.g., BTC for BTC/USDT)
+         # So we need to convert USDT margin_qty -> base_ccy qty using current price
+         
+         # Latest price from the scanner / tickers; one ticker request only if it is stale
+         current_price = price_cache.get(symbol)
+         if current_price is None:
+             prices = await execution_queue.submit(
+                 ex_name, lambda: exchange.get_tickers([symbol]), priority=execution_queue.ORDER
+             )
+             price_cache.update_many(prices)
+             current_price = prices.get(symbol)
+             if not current_price: return
+         
+         # (margin_qty * leverage) / current_price in the base currency, then converted to
+         # contracts and rounded with the cached market metadata (no load_markets here)
+         market_cache.attach(ex_name, exchange)
+         sized = exchange.order_amount(symbol, (margin_qty * leverage) / current_price, current_price)
+         if sized is None:
+              logger.warning(f"User {user_id}: {symbol} order on {ex_name} is below the exchange minimum, skipped")
+              return
+         amount, quantity = sized
+         
+         # Calculate TP / SL Prices from the sizing price: they are placed on the exchange
+         # with the entry, and the same levels are stored for the position monitor
+         if signal == 'LONG':
+              tp_price = current_price * (1 + (tp_percent / 100))
+              sl_price = current_price * (1 - (sl_percent / 100))
+         else:
+              tp_price = current_price * (1 - (tp_percent / 100))
+              sl_price = current_price * (1 + (sl_percent / 100))
+         
+         if order_client_id:
+              # A repeated signal bar must not reach the exchange again: exchanges only guarantee
+              # client ids unique among *open* orders, so a filled market order's id can be reused
+              if await database.get_open_position_by_client_order(user_id, ex_name, order_client_id):
+                   logger.info(f"User {user_id} {symbol} {signal} on {ex_name}: order {order_client_id} already recorded")
+                   return
+              known = await execution_queue.submit(
+                   ex_name, lambda: exchange.fetch_order_by_client_id(symbol, order_client_id), priority=execution_queue.ORDER
+              )
+              if known:
+                   logger.info(f"User {user_id} {symbol} {signal} on {ex_name}: order {order_client_id} already placed, skipped")
+                   return
+         
+         async def place():
+              # From here the order may reach the exchange (see process_signal's deadline handling)
+              state['ordering'] = True
+              return await exchange.open_position(symbol, signal, amount, leverage, margin_mode,
+                                                  tp_price=tp_price, sl_price=sl_price, client_order_id=order_client_id)
+         
+         order = await execution_queue.submit(ex_name, place, priority=execution_queue.ORDER)
+         if order:
+              # Estimate entry price (or use actual if order returned it)
+              entry_price = float(order.get('average') or order.get('price') or current_price)
+              order_id = order.get('id', 'unknown')
+              
+              # Recorded once per client order id; a concurrent run of the same signal bar may have won the insert
+              if not await database.add_open_position(user_id, ex_name, symbol, signal, entry_price, quantity,
+                                                      tp_price, sl_price, order_id, client_order_id=order_client_id):
+                   recorded = await database.get_open_position_by_client_order(user_id, ex_name, order_client_id)
+                   if recorded and recorded.order_id == order_id:
+                        logger.info(f"User {user_id} {symbol} {signal} on {ex_name}: order {order_client_id} already recorded")
+                        return
+                   # A second real order went through under the same client id: track it too
+                   logger.error(f"User {user_id} {symbol} {signal} on {ex_name}: order {order_id} reused client id "
+                                f"{order_client_id} of recorded order {recorded.order_id if recorded else '?'}, recording it separately")
+                   await database.add_open_position(user_id, ex_name, symbol, signal, entry_price, quantity,
+                                                    tp_price, sl_price, order_id)
+              latency = time.monotonic() - started
+              fill_latency[ex_name].append(latency)
+              logger.info(f"User {user_id} Auto-traded {symbol} {signal} on {ex_name} ({latency * 1000:.0f} ms signal-to-fill)")
+              
+    except Exception as e:
+         logger.error(f"Error executing auto-trade on {ex_name} for user {user_id}: {e}")
+
+def latency_summary():
+    """{exchange: (samples, p50 ms, p95 ms)} over the last LATENCY_SAMPLES fills per exchange."""
+    summary = {}
+    for ex_name, samples in fill_latency.items():
+        if samples:
+            ms = np.asarray(samples) * 1000
+            summary[ex_name] = (len(ms), float(np.percentile(ms, 50)), float(np.percentile(ms, 95)))
+    return summary
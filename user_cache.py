@@ -0,0 +1,76 @@
+from collections import OrderedDict
+import config
+
+class UserCache:
+    """
+    Per-user read-through cache for small, frequently read rows (symbols,
+    timeframes, trading config, watched pairs). Bounded by number of users,
+    least recently used users are evicted first.
+
+    Writers call invalidate() after their transaction commits. Readers take a
+    token() before querying and pass it to put(); if any invalidation happened
+    in between, the (possibly stale) value is not cached.
+    """
+    def __init__(self, max_users):
+        self.max_users = max_users
+        self._entries: OrderedDict = OrderedDict()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, field):
+        entry = self._entries.get(user_id)
+        if entry is not None and field in entry:
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return True, entry[field]
+        self.misses += 1
+        return False, None
+
+    def token(self):
+        return self._writes
+
+    def put(self, user_id, field, value, token):
+        if token != self._writes:
+            return
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = self._entries[user_id] = {}
+            if len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(user_id)
+        entry[field] = value
+
+    def invalidate(self, user_id, *fields):
+        """Drop the given fields (all fields if none given) for a user."""
+        self._writes += 1
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        if not fields:
+            del self._entries[user_id]
+            return
+        for field in fields:
+            entry.pop(field, None)
+
+    def clear(self):
+        self._writes += 1
+        self._entries.clear()
+
+_cache = UserCache(config.USER_CACHE_SIZE)
+
+def get(user_id, field):
+    return _cache.get(user_id, field)
+
+def token():
+    return _cache.token()
+
+def put(user_id, field, value, token):
+    _cache.put(user_id, field, value, token)
+
+def invalidate(user_id, *fields):
+    _cache.invalidate(user_id, *fields)
+
+def clear():
+    _cache.clear()
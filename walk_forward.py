@@ -0,0 +1,158 @@
+import os
+import sys
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import ccxt
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import config
+from run_local_backtest import fetch_historical_data, cached_signal_columns, simulate_trades, TRADE_COLUMNS
+from backtest_cache import BacktestCache, data_hash
+
+# ══════════════════════════════════════════════════════
+#  walk_forward.py  —  Walk-forward optimization
+#  Chọn tham số tốt nhất trên cửa sổ train (in-sample),
+#  đánh giá trên cửa sổ test kế tiếp (out-of-sample),
+#  rồi ghép kết quả out-of-sample thành một báo cáo.
+# ══════════════════════════════════════════════════════
+
+# Tham số ảnh hưởng chỉ báo -> tính lại mảng tín hiệu cho mỗi bộ
+INDICATOR_GRID = {
+    'trend_length': [50, 100, 150],
+    'atr_period': [100, 200],
+}
+
+# Tham số chỉ ảnh hưởng mô phỏng -> dùng chung mảng tín hiệu
+TRADE_GRID = {
+    'tp_percent': [None, 1.0, 2.0],
+    'sl_percent': [None, 1.0],
+}
+
+# Cột cần cho simulate_trades — chỉ gửi những cột này sang worker
+_SIM_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'LONG', 'SHORT']
+
+# Trạng thái dùng chung trong mỗi worker process (nạp một lần qua initializer)
+_worker_frames = {}
+_worker_settings = {}
+
+def _grid(grid):
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+
+def _init_worker(frames, settings):
+    global _worker_frames, _worker_settings
+    _worker_frames = frames
+    _worker_settings = settings
+
+def _run_slice(ind_key, trade_params, start, end):
+    df = _worker_frames[ind_key].iloc[start:end]
+    trades, _ = simulate_trades(df, _worker_settings['timeframe'],
+                                order_size=_worker_settings['order_size'],
+                                fee_rate=_worker_settings['fee_rate'],
+                                slippage=_worker_settings['slippage'],
+                                next_bar_entry=_worker_settings['next_bar_entry'],
+                                **trade_params)
+    return trades
+
+def _score(trades):
+    """Mục tiêu tối ưu: tổng PNL net; cần tối thiểu số lệnh để tránh chọn tham số 'may mắn'."""
+    if len(trades) < _worker_settings['min_trades']:
+        return float('-inf')
+    return sum(t['pnl'] for t in trades)
+
+def _run_window(window):
+    """Tối ưu trên train, đánh giá bộ tốt nhất trên test. Chạy trong worker process."""
+    idx, train_start, train_end, test_end = window
+    best = None
+    for ind_key in _worker_frames:
+        for trade_params in _grid(TRADE_GRID):
+            score = _score(_run_slice(ind_key, trade_params, train_start, train_end))
+            if best is None or score > best[0]:
+                best = (score, ind_key, trade_params)
+
+    score, ind_key, trade_params = best
+    oos_trades = _run_slice(ind_key, trade_params, train_end, test_end)
+    params = dict(ind_key)
+    params.update(trade_params)
+    return {
+        'window': idx,
+        'train_start': _worker_frames[ind_key]['timestamp'].iloc[train_start],
+        'test_start': _worker_frames[ind_key]['timestamp'].iloc[train_end],
+        'test_end': _worker_frames[ind_key]['timestamp'].iloc[test_end - 1],
+        'params': params,
+        'train_pnl': score,
+        'test_pnl': sum(t['pnl'] for t in oos_trades),
+        'test_trades': oos_trades,
+    }
+
+def build_windows(n_bars, warmup, train_bars, test_bars):
+    """Các cửa sổ cuộn (train, test) — test của cửa sổ này nằm ngay sau train, cửa sổ sau dịch đi test_bars."""
+    if train_bars < 1 or test_bars < 1:
+        raise ValueError(f"Train / test windows must span at least one bar (got {train_bars} / {test_bars})")
+    windows = []
+    start = warmup
+    while start + train_bars + test_bars <= n_bars:
+        windows.append((len(windows), start, start + train_bars, start + train_bars + test_bars))
+        start += test_bars
+    return windows
+
+def run_walk_forward(symbol='BTC/USDT', timeframe='15m', days=180, train_days=30, test_days=7,
+                     order_size=1000.0, fee_rate=0.0004, slippage=0.0, next_bar_entry=False,
+                     min_trades=3, workers=None, ohlcv=None, use_cache=True):
+    # Kích thước cửa sổ tính theo phút: 1440 // phút-mỗi-nến = 0 với khung 3d / 1w
+    bar_minutes = config.TIMEFRAME_MINUTES[timeframe]
+    train_bars = train_days * 1440 // bar_minutes
+    test_bars = test_days * 1440 // bar_minutes
+    if train_bars < 1 or test_bars < 1:
+        raise ValueError(f"Train {train_days}d / test {test_days}d is shorter than one {timeframe} bar")
+    if ohlcv is None:
+        print(f"Bắt đầu tải dữ liệu {symbol} khung {timeframe} từ Binance...")
+        ohlcv = fetch_historical_data(ccxt.binance(), symbol, timeframe, days)
+    base = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    base['timestamp'] = pd.to_datetime(base['timestamp'], unit='ms')
+
+    # Tính mảng chỉ báo MỘT lần cho mỗi bộ tham số trên toàn chuỗi, sau đó chỉ cắt theo cửa sổ
+    print("Đang tính toán tín hiệu cho từng bộ tham số...")
+    cache = BacktestCache() if use_cache else None
+    digest = data_hash(base) if cache else None
+    frames = {}
+    for ind_params in _grid(INDICATOR_GRID):
+        df = cached_signal_columns(base.copy(), cache, digest, **ind_params)
+        frames[tuple(sorted(ind_params.items()))] = df[_SIM_COLUMNS]
+
+    warmup = max(INDICATOR_GRID['atr_period']) + max(INDICATOR_GRID['trend_length'])
+    windows = build_windows(len(base), warmup, train_bars, test_bars)
+    if not windows:
+        print("Không đủ dữ liệu cho walk-forward")
+        return None
+
+    settings = {'timeframe': timeframe, 'order_size': order_size, 'fee_rate': fee_rate,
+                'slippage': slippage, 'next_bar_entry': next_bar_entry, 'min_trades': min_trades}
+    print(f"Chạy {len(windows)} cửa sổ song song...")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(frames, settings)) as pool:
+        results = list(pool.map(_run_window, windows))
+
+    # Ghép kết quả out-of-sample thành một báo cáo
+    oos = pd.DataFrame([t for r in results for t in r['test_trades']], columns=TRADE_COLUMNS)
+    summary = pd.DataFrame([{k: v for k, v in r.items() if k != 'test_trades'} for r in results])
+
+    total_pnl = oos['pnl'].sum() if len(oos) else 0.0
+    win_rate = oos['win'].mean() * 100 if len(oos) else 0.0
+
+    print("-" * 50)
+    print(f"WALK-FORWARD: {symbol} | Khung: {timeframe} | Train {train_days}d / Test {test_days}d")
+    for r in results:
+        params = ", ".join(f"{k}={v}" for k, v in r['params'].items())
+        print(f"  #{r['window']:>2}  {r['test_start']:%Y-%m-%d} → {r['test_end']:%Y-%m-%d}  "
+              f"train ${r['train_pnl']:.2f}  test ${r['test_pnl']:.2f}  [{params}]")
+    print(f"Tổng số lệnh OOS: {len(oos)}")
+    print(f"Tỉ lệ thắng OOS: {win_rate:.2f}%")
+    print(f"Tổng PNL Net OOS: ${total_pnl:.2f}")
+    print("-" * 50)
+
+    return {'windows': summary, 'trades': oos}
+
+if __name__ == "__main__":
+    run_walk_forward(symbol='BTC/USDT', timeframe='15m', days=180, train_days=30, test_days=7)